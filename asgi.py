@@ -0,0 +1,246 @@
+"""ASGI version of the game server, for asyncio servers such as uvicorn:
+
+    uvicorn asgi:app --workers 1
+
+Serves `/ai-move`, `/cache-stats`, `/metrics`, `/health` and `/` like
+main.py, from the same search pool. Requests await their searches without
+holding a thread, so one process keeps many idle connections open, and a
+search is abandoned if its client disconnects first.
+"""
+
+import asyncio
+import json
+import math
+import time
+
+import metrics
+from search_pool import PoolBusy
+from service import (
+    CORS_ORIGINS,
+    DEFAULT_BUDGET_MS,
+    SEARCH_TIMEOUT_MS,
+    BadRequest,
+    cancel_search,
+    configure_logging,
+    get_pool,
+    known_move,
+    move_cache,
+    observe_request,
+    parse_move_search,
+    searched_move,
+    shutdown_pool,
+    submit_search,
+)
+
+configure_logging()
+
+# Largest request body accepted, in bytes
+MAX_BODY_BYTES = 1 << 20
+# Status recorded for requests whose client left before the response
+CLIENT_CLOSED = 499
+
+
+class Disconnected(Exception):
+    """Raised when the client goes away before the response is sent."""
+
+
+class BodyTooLarge(Exception):
+    """Raised for request bodies over `MAX_BODY_BYTES`."""
+
+
+async def read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise Disconnected
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            raise BodyTooLarge
+        if not message.get("more_body"):
+            return body
+
+
+async def wait_for_disconnect(receive):
+    """Return once the client disconnects, after the body has been read."""
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+def cors_headers(scope) -> list[tuple[bytes, bytes]]:
+    origin = dict(scope["headers"]).get(b"origin", b"")
+    if origin.decode("latin-1") not in CORS_ORIGINS:
+        return []
+    return [(b"access-control-allow-origin", origin), (b"vary", b"Origin")]
+
+
+async def send_json(scope, send, status: int, body, headers=()):
+    payload = json.dumps(body).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(payload)).encode()),
+                *cors_headers(scope),
+                *headers,
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": payload})
+
+
+async def ai_move(scope, receive, send):
+    try:
+        body = await read_body(receive)
+    except BodyTooLarge:
+        return await send_json(scope, send, 413, {"error": "Request too large"})
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return await send_json(scope, send, 400, {"error": "Invalid JSON"})
+    try:
+        search = parse_move_search(data)
+    except BadRequest as e:
+        return await send_json(scope, send, 400, {"error": str(e)})
+
+    # The move cache may read and write its SQLite file
+    known = await asyncio.to_thread(known_move, search)
+    if known is not None:
+        return await send_json(scope, send, 200, known)
+
+    try:
+        future = submit_search(search)
+    except PoolBusy:
+        retry_after = str(math.ceil(DEFAULT_BUDGET_MS / 1000)).encode()
+        return await send_json(
+            scope, send, 503, {"error": "Server busy"}, [(b"retry-after", retry_after)]
+        )
+
+    result = asyncio.wrap_future(future)
+    disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await asyncio.wait(
+            {result, disconnect},
+            timeout=SEARCH_TIMEOUT_MS / 1000,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+    finally:
+        disconnect.cancel()
+
+    if not result.done():
+        # Drops the search if it is still queued, and stops it if running
+        cancel_search(future)
+        if disconnect.done() and not disconnect.cancelled():
+            return  # Nobody left to answer
+        return await send_json(scope, send, 504, {"error": "Search timed out"})
+
+    response = await asyncio.to_thread(searched_move, search, result.result())
+    await send_json(scope, send, 200, response)
+
+
+async def index(scope, receive, send):
+    await send_json(scope, send, 200, {"message": "Welcome to the Bitboard Game API!"})
+
+
+async def cache_stats(scope, receive, send):
+    await send_json(scope, send, 200, move_cache.stats())
+
+
+async def prometheus_metrics(scope, receive, send):
+    payload = metrics.render().encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", metrics.CONTENT_TYPE.encode()),
+                (b"content-length", str(len(payload)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": payload})
+
+
+async def health(scope, receive, send):
+    await send_json(scope, send, 200, {"status": "healthy"})
+
+
+ROUTES = {
+    ("POST", "/ai-move"): ai_move,
+    ("GET", "/"): index,
+    ("GET", "/cache-stats"): cache_stats,
+    ("GET", "/metrics"): prometheus_metrics,
+    ("GET", "/health"): health,
+}
+
+
+async def preflight(scope, receive, send):
+    """Answer a CORS preflight request."""
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 204,
+            "headers": [
+                *cors_headers(scope),
+                (b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+                (b"access-control-allow-headers", b"Content-Type"),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # Start the search processes before taking requests
+            await asyncio.to_thread(get_pool)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            shutdown_pool()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    started = time.perf_counter()
+    status = CLIENT_CLOSED
+
+    async def send_and_record(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        await send(message)
+
+    method, path = scope["method"], scope["path"]
+    known_path = any(route == path for _, route in ROUTES)
+    handler = ROUTES.get((method, path))
+    try:
+        if handler is not None:
+            try:
+                await handler(scope, receive, send_and_record)
+            except Disconnected:
+                pass
+        elif method == "OPTIONS" and known_path:
+            await preflight(scope, receive, send_and_record)
+        elif known_path:
+            await send_json(
+                scope, send_and_record, 405, {"error": "Method not allowed"}
+            )
+        else:
+            await send_json(scope, send_and_record, 404, {"error": "Not found"})
+    except Exception:
+        status = 500  # The server answers for us
+        raise
+    finally:
+        # Label by path only for known routes, so unknown paths share one
+        route = path if known_path else "unmatched"
+        observe_request(route, status, time.perf_counter() - started)
@@ -0,0 +1,246 @@
+"""Benchmarks of the game engine and search hot paths.
+
+Time the move generation, move making, capture and win checks, a perft
+node count and fixed depth searches on the same positions every run, and
+compare the results with those of another commit:
+
+    python bench.py --output before.json
+    python bench.py --output after.json --compare before.json
+
+Positions are early, middle and late game states played out from a fixed
+seed for each board size. Each benchmark takes the best of `--repeat`
+runs. With `--compare`, benchmarks more than `--threshold` slower than the
+baseline are listed and the exit status is 1.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from bitboard import BitboardGame, BitboardState, GameConfig
+from minimax import find_best_move
+
+# Share of the board filled in each benchmark position
+STAGES = {"early": 0.15, "mid": 0.4, "late": 0.7}
+# Passes over the positions' moves in each run of the per-move benchmarks,
+# so a run takes long enough to time
+ROUNDS = 100
+
+
+def play_position(game: BitboardGame, fill: float, rng: random.Random) -> BitboardState:
+    """Play random moves until `fill` of the board is taken.
+
+    Moves that win, or let the next player win at once, are avoided so the
+    searches have something to search.
+    """
+    state = game.new_game_state()
+    squares = game.config.rows * game.config.cols
+    while state.occupied.bit_count() < fill * squares:
+        moves = game.legal_move_indices(state)
+        rng.shuffle(moves)
+        for move in moves:
+            next_state, won = game.play_move_index(move, state)
+            threats = game.threat_index(next_state).squares[next_state.current_player]
+            if not won and not threats & game.empty_squares(next_state):
+                state = next_state
+                break
+        else:
+            break  # No quiet moves left
+    return state
+
+
+def perft(game: BitboardGame, state: BitboardState, depth: int) -> int:
+    """Count the positions reached in `depth` moves, stopping at wins."""
+    if depth == 0:
+        return 1
+    nodes = 0
+    for move in game.legal_move_indices(state):
+        next_state, won = game.play_move_index(move, state)
+        nodes += 1 if won else perft(game, next_state, depth - 1)
+    return nodes
+
+
+def time_runs(function, repeat: int) -> tuple[float, float, object]:
+    """Best and median seconds of `repeat` calls, and the last result.
+
+    The garbage collector is off while timing, as in `timeit`.
+    """
+    times = []
+    result = None
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = function()
+            times.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return min(times), statistics.median(times), result
+
+
+def bench_board(
+    rows: int, cols: int, repeat: int, perft_depth: int, search_depth: int, seed: int
+) -> dict[str, dict]:
+    game = BitboardGame(GameConfig(players=2, rows=rows, cols=cols))
+    rng = random.Random(seed)
+    positions = {
+        stage: play_position(game, fill, rng) for stage, fill in STAGES.items()
+    }
+    # Every legal move of every position, for the per-move benchmarks
+    moves = [
+        (state, move)
+        for state in positions.values()
+        for move in game.legal_move_indices(state)
+    ]
+
+    def play_move():
+        for _ in range(ROUNDS):
+            for state, move in moves:
+                game.play_move_index(move, state)
+
+    def remove_pieces():
+        for _ in range(ROUNDS):
+            for state, move in moves:
+                boards = list(state.boards)
+                boards[state.current_player] |= 1 << move
+                game.remove_pieces_index(move, boards, state.current_player)
+
+    def legal_moves():
+        for _ in range(ROUNDS * 10):
+            for state in positions.values():
+                game.legal_move_indices(state)
+
+    def get_winner():
+        for _ in range(ROUNDS):
+            for state, move in moves:
+                player = state.current_player
+                game.get_winner(1 << move, player, state.boards[player] | 1 << move)
+
+    benchmarks = {
+        "play_move": (play_move, ROUNDS * len(moves)),
+        "remove_pieces": (remove_pieces, ROUNDS * len(moves)),
+        "legal_moves": (legal_moves, ROUNDS * 10 * len(positions)),
+        "get_winner": (get_winner, ROUNDS * len(moves)),
+    }
+
+    results = {}
+    for name, (function, ops) in benchmarks.items():
+        best, median, _ = time_runs(function, repeat)
+        results[name] = {"seconds": best, "median": median, "ops": ops}
+
+    # Late positions keep the count small enough on large boards
+    best, median, nodes = time_runs(
+        lambda: perft(game, positions["late"], perft_depth), repeat
+    )
+    results[f"perft/{perft_depth}"] = {"seconds": best, "median": median, "ops": nodes}
+
+    for stage, state in positions.items():
+        best, median, move = time_runs(
+            lambda: find_best_move(game, state, search_depth), repeat
+        )
+        results[f"find_best_move/{search_depth}/{stage}"] = {
+            "seconds": best,
+            "median": median,
+            "ops": 1,
+            "move": list(move),
+        }
+
+    for result in results.values():
+        result["ops_per_s"] = result["ops"] / result["seconds"]
+    return {f"{rows}x{cols}/{name}": result for name, result in results.items()}
+
+
+def git_commit() -> str | None:
+    """The commit of this checkout, wherever the benchmarks run from."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Print the speed of each benchmark against the baseline, returning the
+    names of those slower by more than `threshold`."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:40} new")
+            continue
+        ratio = result["ops_per_s"] / base["ops_per_s"]
+        slower = ratio < 1 - threshold
+        flag = "  SLOWER" if slower else ""
+        print(f"{name:40} {ratio:6.2f}x{flag}")
+        if slower:
+            regressions.append(name)
+        if "move" in base and base["move"] != result.get("move"):
+            print(f"{'':40} move {base['move']} -> {result.get('move')}")
+    return regressions
+
+
+def parse_size(size: str) -> tuple[int, int]:
+    rows, _, cols = size.partition("x")
+    return int(rows), int(cols or rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", default="5x5,8x8", help="Board sizes, comma separated"
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Runs of each benchmark")
+    parser.add_argument("--perft-depth", type=int, default=3)
+    parser.add_argument("--search-depth", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the positions")
+    parser.add_argument("--output", help="JSON file for the results")
+    parser.add_argument("--compare", help="JSON results to compare against")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1, help="Slowdown that fails a compare"
+    )
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes.split(","):
+        rows, cols = parse_size(size)
+        board_results = bench_board(
+            rows, cols, args.repeat, args.perft_depth, args.search_depth, args.seed
+        )
+        for name, result in board_results.items():
+            print(f"{name:40} {result['ops_per_s']:14.1f}/s")
+        results.update(board_results)
+
+    if args.output:
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "date": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "args": vars(args),
+            },
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        print()
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
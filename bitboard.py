@@ -1,23 +1,90 @@
 """Bitboard implementation for CompleteTheSquare game."""
 
-from collections import defaultdict
-from dataclasses import dataclass, replace
+import random
+import threading
+from dataclasses import InitVar, dataclass, field, replace
 from itertools import product
 
 DIRECTIONS = [(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)]
 
+# Zobrist keys are shared by every board size, so a position hashes the same
+# in every process. Tables grow on demand: ZOBRIST_SQUARES[player][square]
+ZOBRIST_SEED = 0x5C0A2E
+ZOBRIST_SQUARES: list[list[int]] = []
+ZOBRIST_TURN: list[int] = []
+# Held while the tables grow, so threads don't append keys at wrong indices
+ZOBRIST_LOCK = threading.Lock()
+
+
+def iter_bits(mask: int):
+    """Yield the index of each set bit, lowest first."""
+    while mask:
+        bit = mask & -mask
+        yield bit.bit_length() - 1
+        mask ^= bit
+
+
+def zobrist_keys(players: int, squares: int) -> tuple[list[list[int]], list[int]]:
+    """Return the Zobrist tables, grown to cover `players` x `squares`.
+
+    Each key depends only on its player and square, not on the order the
+    tables grew in.
+    """
+    # Lists grow in player order, so the last one is the shortest
+    if len(ZOBRIST_SQUARES) < players or len(ZOBRIST_SQUARES[-1]) < squares:
+        with ZOBRIST_LOCK:
+            while len(ZOBRIST_TURN) < players:
+                ZOBRIST_TURN.append(_zobrist_key("turn", len(ZOBRIST_TURN)))
+                ZOBRIST_SQUARES.append([])
+            for player, keys in enumerate(ZOBRIST_SQUARES):
+                while len(keys) < squares:
+                    keys.append(_zobrist_key("square", player, len(keys)))
+    return ZOBRIST_SQUARES, ZOBRIST_TURN
+
+
+def _zobrist_key(*parts) -> int:
+    return random.Random(repr((ZOBRIST_SEED, *parts))).getrandbits(64)
+
+
+def zobrist_hash(boards: tuple[int, ...], current_player: int) -> int:
+    """Compute the Zobrist hash of a position from scratch."""
+    squares = max(board.bit_length() for board in boards) if boards else 0
+    square_keys, turn_keys = zobrist_keys(max(len(boards), current_player + 1), squares)
+
+    key = turn_keys[current_player]
+    for player, board in enumerate(boards):
+        keys = square_keys[player]
+        for square in iter_bits(board):
+            key ^= keys[square]
+    return key
+
 
 @dataclass
 class GameConfig:
     players: int = 2
     rows: int = 5
     cols: int = 5
+    # Evaluation weights by heuristic name, see `evaluation.HEURISTICS`
+    weights: dict[str, float] = field(default_factory=dict)
+    # Score for the player to move when a position repeats in a search:
+    # a draw by default, negative to make the player avoid repeating
+    repetition_score: float = 0.0
 
 
 @dataclass(frozen=True)
 class BitboardState:
     boards: tuple[int, ...]  # Tuple of bitboards for each player
     current_player: int
+    zobrist: InitVar[int | None] = None  # Known hash, e.g. from `play_move`
+    key: int = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self, zobrist: int | None):
+        if zobrist is None:
+            zobrist = zobrist_hash(self.boards, self.current_player)
+        object.__setattr__(self, "key", zobrist)
+
+    def __hash__(self) -> int:
+        return self.key
 
     @property
     def occupied(self) -> int:
@@ -29,7 +96,7 @@ class BitboardState:
 
     def copy(self):
         """Create a copy of the current state."""
-        return BitboardState(self.boards, self.current_player)
+        return BitboardState(self.boards, self.current_player, self.key)
 
     @staticmethod
     def default(players: int = 2) -> "BitboardState":
@@ -41,13 +108,164 @@ class BitboardState:
         return self.occupied & move_bitboard == 0
 
 
+class ThreatIndex:
+    """Corner masks that one more move would complete, per player.
+
+    A mask is a threat for a player who holds three of its corners while
+    the fourth is empty. `counts[player][square]` is the number of threats
+    that a move on the square completes, so it wins the game when non-zero,
+    and `squares[player]` is the bitmask of those winning squares.
+    """
+
+    __slots__ = ("owner", "counts", "squares", "totals")
+
+    def __init__(self, game: "BitboardGame", boards: list[int] | tuple[int, ...]):
+        players = game.config.players
+        # mask -> (player, missing square) for every current threat
+        self.owner: dict[int, tuple[int, int]] = {}
+        self.counts = [
+            [0] * (game.config.rows * game.config.cols) for _ in range(players)
+        ]
+        self.squares = [0] * players
+        self.totals = [0] * players
+        self.update(boards, game.corner_masks)
+
+    def update(self, boards: list[int] | tuple[int, ...], masks):
+        """Refresh the threat status of masks whose corners have changed."""
+        occupied = 0
+        for board in boards:
+            occupied |= board
+
+        owner = self.owner
+        for mask in masks:
+            threat = None
+            filled = occupied & mask
+            if filled.bit_count() == 3:
+                for player, board in enumerate(boards):
+                    if board & mask == filled:
+                        threat = (player, (mask ^ filled).bit_length() - 1)
+                        break
+
+            old = owner.get(mask)
+            if old == threat:
+                continue
+            if old is not None:
+                player, square = old
+                del owner[mask]
+                self.totals[player] -= 1
+                self.counts[player][square] -= 1
+                if not self.counts[player][square]:
+                    self.squares[player] &= ~(1 << square)
+            if threat is not None:
+                player, square = threat
+                owner[mask] = threat
+                self.totals[player] += 1
+                self.counts[player][square] += 1
+                self.squares[player] |= 1 << square
+
+
+class SearchPosition:
+    """Mutable game position for searches, updated in place.
+
+    `make_move` records what it changed so `unmake_move` can restore the
+    previous position exactly, without allocating a new state per node.
+    Use `BitboardState` everywhere else.
+    """
+
+    __slots__ = ("game", "boards", "current_player", "key", "history", "threats")
+
+    def __init__(self, game: "BitboardGame", state: BitboardState):
+        self.game = game
+        self.boards = list(state.boards)
+        self.current_player = state.current_player
+        self.key = state.key
+        # (square, player, captures, key) for every move made
+        self.history: list[tuple[int, int, list[tuple[int, int]], int]] = []
+        self.threats = ThreatIndex(game, self.boards)
+
+    @property
+    def occupied(self) -> int:
+        """Bitmask of all occupied squares (OR of all boards)."""
+        result = 0
+        for board in self.boards:
+            result |= board
+        return result
+
+    def to_state(self) -> BitboardState:
+        """Return an immutable snapshot of the position."""
+        return BitboardState(tuple(self.boards), self.current_player, self.key)
+
+    def make_move(self, square: int) -> bool:
+        """Play a move given as a square index, returning whether it wins."""
+        game = self.game
+        boards = self.boards
+        player = self.current_player
+        move_bitboard = 1 << square
+        zobrist_squares = game.zobrist_squares
+
+        # Captures never add to the player's pieces, so the move wins exactly
+        # when it completes one of the player's threats
+        winner = self.threats.counts[player][square] > 0
+
+        key = self.key ^ zobrist_squares[player][square]
+        boards[player] |= move_bitboard
+
+        captures = game.capture_masks(square, boards, player)
+        for opponent, captured in captures:
+            boards[opponent] &= ~captured
+            for captured_square in iter_bits(captured):
+                key ^= zobrist_squares[opponent][captured_square]
+
+        self.threats.update(boards, game.changed_corner_masks(square, captures))
+
+        next_player = (player + 1) % game.config.players if not winner else player
+        key ^= game.zobrist_turn[player] ^ game.zobrist_turn[next_player]
+
+        self.history.append((square, player, captures, self.key))
+        self.current_player = next_player
+        self.key = key
+
+        return winner
+
+    def unmake_move(self):
+        """Undo the last `make_move`."""
+        square, player, captures, key = self.history.pop()
+        boards = self.boards
+        boards[player] &= ~(1 << square)
+        for opponent, captured in captures:
+            boards[opponent] |= captured
+        self.threats.update(boards, self.game.changed_corner_masks(square, captures))
+        self.current_player = player
+        self.key = key
+
+
+# `tables.GameTables` fields that games also have as attributes
+TABLE_ATTRIBUTES = (
+    "full_mask",
+    "square_corner_masks",
+    "corner_masks",
+    "rays",
+    "opponents",
+    "symmetries",
+    "inverse_symmetries",
+    "symmetry_tables",
+    "zobrist_squares",
+    "zobrist_turn",
+)
+
+
 class BitboardGame:
     def __init__(
         self,
         config: GameConfig,
     ):
+        from tables import get_tables  # Imports this module
+
         self.config = config
-        self.move_to_corner_masks = self._get_square_corner_bitmasks()
+        # The shape's shared tables, also copied to attributes of the game
+        self.tables = get_tables(config)
+        for name in TABLE_ATTRIBUTES:
+            setattr(self, name, getattr(self.tables, name))
 
     def new_game_state(self) -> BitboardState:
         """Create a new game state with all boards empty and player 0."""
@@ -75,19 +293,27 @@ class BitboardGame:
                 out += "."
         return out
 
+    def empty_squares(self, state: BitboardState) -> int:
+        """Bitmask of all empty squares."""
+        return self.full_mask & ~state.occupied
+
+    def legal_move_indices(self, state: BitboardState) -> list[int]:
+        """Generate all legal moves as square indices (`row * cols + col`)."""
+        return list(iter_bits(self.empty_squares(state)))
+
     def legal_moves(self, state: BitboardState) -> list[tuple]:
         """Generate all legal moves for the current player."""
-
-        moves = []
-        for row, col in product(range(self.config.rows), range(self.config.cols)):
-            position = self.square_to_bitboard((row, col))
-            if state.is_valid_move(position):
-                moves.append((row, col))
-        return moves
+        cols = self.config.cols
+        return [divmod(square, cols) for square in self.legal_move_indices(state)]
 
     def play_move(self, move: tuple, state: BitboardState):
         """Play a move for a player."""
         move_bitboard = self.square_to_bitboard(move)
+        return self.play_move_index(move_bitboard.bit_length() - 1, state)
+
+    def play_move_index(self, square: int, state: BitboardState):
+        """Play a move given as a square index."""
+        move_bitboard = 1 << square
         assert state.is_valid_move(move_bitboard)
 
         player = state.current_player
@@ -96,93 +322,167 @@ class BitboardGame:
         # Update the board for the current player
         boards[player] |= move_bitboard
         # Check if the move captures any opponent pieces
-        boards = self.remove_pieces(move, boards, player)
+        boards = self.remove_pieces_index(square, boards, player)
 
         winner = self.get_winner(move_bitboard, player, boards[player])
 
         next_player = (player + 1) % self.config.players if not winner else player
-        new_state = replace(state, boards=tuple(boards), current_player=next_player)
+
+        # Update the hash incrementally: the placed piece, any captured
+        # pieces and the side to move
+        key = state.key ^ self.zobrist_squares[player][square]
+        for opponent, (before, after) in enumerate(zip(state.boards, boards)):
+            for captured in iter_bits(before & ~after):
+                key ^= self.zobrist_squares[opponent][captured]
+        key ^= self.zobrist_turn[player] ^ self.zobrist_turn[next_player]
+
+        new_state = BitboardState(tuple(boards), next_player, key)
 
         return new_state, winner
 
-    def _get_square_corner_bitmasks(self):
-        """Compute the masks for the corners of all possible squares."""
-
-        move_to_mask: dict[int, list[int]] = defaultdict(list)
-
-        rows, cols = self.config.rows, self.config.cols
-        s = min(rows, cols)  # Maximum size of the square
-
-        for size in range(2, s + 1):  # Size of the square (2x2, 3x3, sxs)
-            for row_offset in range(rows - size + 1):
-                for col_offset in range(cols - size + 1):
-
-                    # Create a bitmask for the corners of the square
-                    top_left_mask = self.square_to_bitboard((row_offset, col_offset))
-                    top_right_mask = self.square_to_bitboard(
-                        (row_offset, col_offset + size - 1)
-                    )
-                    bottom_left_mask = self.square_to_bitboard(
-                        (row_offset + size - 1, col_offset)
-                    )
-                    bottom_right_mask = self.square_to_bitboard(
-                        (row_offset + size - 1, col_offset + size - 1)
-                    )
-
-                    # Combine the masks into a single integer
-                    mask = (
-                        top_left_mask
-                        | top_right_mask
-                        | bottom_left_mask
-                        | bottom_right_mask
-                    )
-
-                    # Store the mask
-                    move_to_mask[top_left_mask].append(mask)
-                    move_to_mask[top_right_mask].append(mask)
-                    move_to_mask[bottom_left_mask].append(mask)
-                    move_to_mask[bottom_right_mask].append(mask)
-
-        return move_to_mask
+    def transform_board(self, board: int, symmetry: int) -> int:
+        """Apply a symmetry (index into `symmetries`) to a bitboard."""
+        result = 0
+        for table in self.symmetry_tables[symmetry]:
+            if not board:
+                break
+            result |= table[board & 255]
+            board >>= 8
+        return result
+
+    def transform_state(self, state: BitboardState, symmetry: int) -> BitboardState:
+        """Apply a symmetry to every board of the state."""
+        return BitboardState(
+            tuple(self.transform_board(board, symmetry) for board in state.boards),
+            state.current_player,
+        )
+
+    def canonical(self, state: BitboardState) -> tuple[BitboardState, int]:
+        """Return the canonical form of the state and the symmetry giving it.
+
+        Positions that are rotations or reflections of each other have the
+        same canonical form. Map a square of the canonical state back with
+        `untransform_square`.
+        """
+        best_boards = state.boards
+        best_symmetry = 0
+        for symmetry in range(1, len(self.symmetries)):
+            boards = tuple(
+                self.transform_board(board, symmetry) for board in state.boards
+            )
+            if boards < best_boards:
+                best_boards = boards
+                best_symmetry = symmetry
+
+        if best_symmetry == 0:
+            return state, 0
+        return BitboardState(best_boards, state.current_player), best_symmetry
+
+    def untransform_square(self, square: int, symmetry: int) -> int:
+        """Map a square index back through a symmetry."""
+        return self.symmetries[self.inverse_symmetries[symmetry]][square]
+
+    def unique_moves(
+        self, state: BitboardState | SearchPosition, moves: list[int]
+    ) -> list[int]:
+        """Drop moves that a symmetry of the position makes equivalent.
+
+        The first move of each equivalent group is kept, in order.
+        """
+        stabilizer = [
+            symmetry
+            for symmetry in range(1, len(self.symmetries))
+            if all(
+                self.transform_board(board, symmetry) == board for board in state.boards
+            )
+        ]
+        if not stabilizer:
+            return moves
+
+        seen = set()
+        unique = []
+        for move in moves:
+            if move in seen:
+                continue
+            unique.append(move)
+            seen.add(move)
+            seen.update(self.symmetries[symmetry][move] for symmetry in stabilizer)
+        return unique
 
     def iter_corner_masks(self):
         """Iterate over all corner masks."""
-        for masks in self.move_to_corner_masks.values():
-            yield from masks
+        yield from self.corner_masks
+
+    def changed_corner_masks(self, square: int, captures: list[tuple[int, int]]):
+        """Corner masks touched by a move on the square and its captures."""
+        if not captures:
+            return self.square_corner_masks[square]
+
+        masks = set(self.square_corner_masks[square])
+        for _, captured in captures:
+            for captured_square in iter_bits(captured):
+                masks.update(self.square_corner_masks[captured_square])
+        return masks
+
+    def threat_index(self, state: BitboardState) -> ThreatIndex:
+        """Index the squares that would complete a square, for every player."""
+        return ThreatIndex(self, state.boards)
 
     def get_winner(self, move_bitboard: int, player: int, player_board: int) -> bool:
         """Determine the winner of the game."""
 
         return any(
             (player_board & mask) == mask
-            for mask in self.move_to_corner_masks[move_bitboard]
+            for mask in self.square_corner_masks[move_bitboard.bit_length() - 1]
         )
 
     def remove_pieces(self, move: tuple, boards: list[int], player: int):
         """Efficiently remove captured opponent pieces in all directions."""
         row, col = move
-        rows, cols = self.config.rows, self.config.cols
-
-        for opponent in set(range(self.config.players)) - {player}:
-            for dr, dc in DIRECTIONS:
-                captured_mask = 0
-                r, c = row + dr, col + dc
-                while 0 <= r < rows and 0 <= c < cols:
-                    bit = self.square_to_bitboard((r, c))
-                    if boards[opponent] & bit:
-                        captured_mask |= bit
-                    elif boards[player] & bit:
-                        # Capture! Remove all at once
-                        # print(f"Player {player} captures pieces on move {row},{col}")
-                        boards[opponent] &= ~captured_mask
-                        break
-                    else:
-                        break
-                    r += dr
-                    c += dc
+        return self.remove_pieces_index(row * self.config.cols + col, boards, player)
 
+    def remove_pieces_index(self, square: int, boards: list[int], player: int):
+        """Remove captured opponent pieces around the square index."""
+        for opponent, captured in self.capture_masks(square, boards, player):
+            boards[opponent] &= ~captured
         return boards
 
+    def capture_masks(
+        self, square: int, boards: list[int] | tuple[int, ...], player: int
+    ) -> list[tuple[int, int]]:
+        """List the `(opponent, mask)` pieces that a move on square captures.
+
+        The boards are not modified, and need not include the move itself.
+        """
+        own = boards[player]
+        captures = []
+
+        for ray, ascending in self.rays[square]:
+            for opponent in self.opponents[player]:
+                opponent_board = boards[opponent]
+                if not opponent_board & ray:
+                    continue
+
+                # The first square along the ray that isn't the opponent's
+                blockers = ray & ~opponent_board
+                if not blockers:
+                    continue  # Opponent pieces run to the edge of the board
+                if ascending:
+                    blocker = blockers & -blockers
+                    between = ray & (blocker - 1)
+                else:
+                    blocker = 1 << (blockers.bit_length() - 1)
+                    between = ray & ~((blocker << 1) - 1)
+
+                if blocker & own and between:
+                    captures.append((opponent, between))
+
+        return captures
+
+    def search_position(self, state: BitboardState) -> "SearchPosition":
+        """Create a mutable copy of the state for make/unmake searches."""
+        return SearchPosition(self, state)
+
     def play(self):
         """Play a simple game loop."""
 
@@ -234,6 +534,151 @@ def test_board_state_hash():
     assert hash(state1) != hash(state2), "Modified state should have a different hash"
 
 
+def test_remove_pieces():
+    """Test captures along rows, columns and diagonals."""
+    game = BitboardGame(GameConfig(players=2, rows=5, cols=5))
+
+    def board(*squares):
+        return sum(game.square_to_bitboard(square) for square in squares)
+
+    # Player 0 at (2, 0), (0, 2), (4, 4) and (2, 4); player 1 in between
+    boards = [
+        board((2, 0), (0, 2), (4, 4), (2, 4)),
+        board((2, 1), (1, 2), (3, 3), (2, 3), (3, 2)),
+    ]
+    boards = game.remove_pieces((2, 2), boards, 0)
+    # (3, 2) runs into an empty square, so it is not captured
+    assert boards[1] == board((3, 2)), game.show(BitboardState(tuple(boards), 0))
+
+    # A line of opponent pieces reaching the edge is not captured
+    boards = [board((0, 0)), board((0, 1), (0, 2), (0, 3), (0, 4))]
+    assert game.remove_pieces((0, 0), boards, 0)[1] == board(
+        (0, 1), (0, 2), (0, 3), (0, 4)
+    )
+
+    # Captures are checked against every opponent
+    game = BitboardGame(GameConfig(players=3, rows=3, cols=3))
+    boards = [board((0, 0), (2, 2)), board((1, 0)), board((1, 1))]
+    boards = game.remove_pieces((2, 0), boards, 0)
+    assert boards == [board((0, 0), (2, 2)), 0, board((1, 1))]
+
+
+def test_make_unmake_move():
+    """Test that SearchPosition matches play_move and undoes moves exactly."""
+    game = BitboardGame(GameConfig(players=2, rows=5, cols=5))
+    state = game.new_game_state()
+    position = game.search_position(state)
+
+    states = [state]
+    for move in [(0, 0), (0, 1), (1, 1), (3, 3), (0, 2), (2, 2)]:
+        state, winner = game.play_move(move, state)
+        assert position.make_move(move[0] * 5 + move[1]) == winner
+        assert position.to_state() == state and position.key == state.key
+        states.append(state)
+
+    while position.history:
+        states.pop()
+        position.unmake_move()
+        assert position.to_state() == states[-1]
+        assert position.key == states[-1].key
+
+
+def test_threat_index():
+    """Test that the threat index tracks placements, captures and undos."""
+    game = BitboardGame(GameConfig(players=2, rows=5, cols=5))
+    position = game.search_position(game.new_game_state())
+
+    def check():
+        fresh = ThreatIndex(game, position.boards)
+        assert position.threats.owner == fresh.owner
+        assert position.threats.squares == fresh.squares
+        assert position.threats.totals == fresh.totals
+
+    # Player 0 threatens (1, 1) and player 1 threatens (4, 4), until player
+    # 0 plays (4, 4) and captures (4, 3)
+    moves = [(0, 0), (3, 3), (0, 1), (3, 4), (1, 0), (4, 3), (4, 2), (2, 2)]
+    for row, col in moves:
+        assert not position.make_move(row * 5 + col)
+        check()
+    assert position.threats.squares == [1 << 6, 1 << 24]
+
+    assert not position.make_move(24)
+    check()
+    assert position.threats.totals == [1, 0]
+
+    assert not position.make_move(4)
+    assert position.make_move(6), "(1, 1) completes player 0's square"
+    check()
+
+    while position.history:
+        position.unmake_move()
+        check()
+    assert position.threats.owner == {}
+
+
+def test_symmetries():
+    """Test that symmetric positions share a canonical form and moves."""
+    for rows, cols in [(5, 5), (4, 6)]:
+        game = BitboardGame(GameConfig(players=2, rows=rows, cols=cols))
+        assert len(game.symmetries) == (8 if rows == cols else 4)
+
+        state = game.new_game_state()
+        for move in [(0, 0), (0, 1), (1, 1), (3, 2), (0, 2)]:
+            state, _ = game.play_move(move, state)
+        canonical, _ = game.canonical(state)
+
+        for symmetry, permutation in enumerate(game.symmetries):
+            image = game.transform_state(state, symmetry)
+            assert game.canonical(image)[0] == canonical
+
+            # Playing a move commutes with the symmetry
+            square = game.legal_move_indices(state)[3]
+            played, _ = game.play_move_index(square, state)
+            image_played, _ = game.play_move_index(permutation[square], image)
+            assert game.transform_state(played, symmetry) == image_played
+            assert game.untransform_square(permutation[square], symmetry) == square
+
+    # The empty 5x5 board has 6 distinct first moves
+    game = BitboardGame(GameConfig(players=2, rows=5, cols=5))
+    state = game.new_game_state()
+    assert len(game.unique_moves(state, game.legal_move_indices(state))) == 6
+
+
+def test_incremental_zobrist():
+    """Test that play_move keeps the Zobrist hash in sync with the boards."""
+    game = BitboardGame(GameConfig(players=2, rows=5, cols=5))
+    state = game.new_game_state()
+
+    # Player 0 captures (0, 1) with the move (0, 2)
+    for move in [(0, 0), (0, 1), (1, 1), (3, 3), (0, 2)]:
+        state, _ = game.play_move(move, state)
+        fresh = BitboardState(state.boards, state.current_player)
+        assert state.key == fresh.key, f"Stale hash after {move}"
+        assert state == fresh and hash(state) == hash(fresh)
+    assert state.boards[1] == game.square_to_bitboard((3, 3)), "(0, 1) not captured"
+
+
+def test_zobrist_keys_threads():
+    """Test that tables grown by several threads at once hold the right keys."""
+    sizes = [(2 + i % 3, 100 + 20 * i) for i in range(8)]
+    threads = [threading.Thread(target=zobrist_keys, args=size) for size in sizes]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    square_keys, turn_keys = zobrist_keys(4, 240)
+    assert turn_keys == [_zobrist_key("turn", p) for p in range(len(turn_keys))]
+    for player, keys in enumerate(square_keys):
+        assert keys == [_zobrist_key("square", player, s) for s in range(len(keys))]
+
+
 if __name__ == "__main__":
     test_board_state_hash()
+    test_remove_pieces()
+    test_incremental_zobrist()
+    test_make_unmake_move()
+    test_threat_index()
+    test_symmetries()
+    test_zobrist_keys_threads()
     test_simple_game()
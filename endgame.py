@@ -0,0 +1,218 @@
+"""Exact endgame solver for Complete The Square.
+
+With few empty squares left, the game tree is small enough to search to
+the end: a win for the player to move scores 1, a loss -1, a full board 0
+and a repeated position `GameConfig.repetition_score`.
+"""
+
+import os
+import time
+from typing import Callable
+
+from bitboard import BitboardGame, BitboardState, GameConfig, SearchPosition
+from minimax import CANCEL_CHECK_NODES, order_moves, search_root
+
+# Solve positions with at most this many empty squares
+SOLVE_EMPTY_SQUARES = 8
+# Give up on positions whose tree turns out bigger than this
+MAX_SOLVER_NODES = 200_000
+# Rough size of a solved table entry (the dict slot, key and value tuples),
+# in bytes
+SOLVED_ENTRY_BYTES = 320
+
+
+class SolverGaveUp(Exception):
+    """Raised when a position takes too many nodes or too long to solve."""
+
+
+class SolvedTable:
+    """Table of exact results, kept for the life of the process and bounded
+    to about `max_bytes`.
+
+    Results are keyed on the boards and player to move, not on hashes, and
+    on the board shape and repetition score of the game, since one process
+    solves games of several configs. So they are never wrong, however long
+    the table lives.
+    """
+
+    def __init__(self, max_bytes: int = 32 << 20):
+        self.max_entries = max(1, max_bytes // SOLVED_ENTRY_BYTES)
+        self.entries: dict[tuple, tuple[float, int | None]] = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def _key(game: BitboardGame, position: SearchPosition) -> tuple:
+        config = game.config
+        return (
+            config.players,
+            config.rows,
+            config.cols,
+            config.repetition_score,
+            tuple(position.boards),
+            position.current_player,
+        )
+
+    def get(
+        self, game: BitboardGame, position: SearchPosition
+    ) -> tuple[float, int | None] | None:
+        return self.entries.get(self._key(game, position))
+
+    def put(
+        self,
+        game: BitboardGame,
+        position: SearchPosition,
+        value: float,
+        move: int | None,
+    ):
+        if len(self.entries) >= self.max_entries:
+            del self.entries[next(iter(self.entries))]  # Oldest first
+        self.entries[self._key(game, position)] = (value, move)
+
+
+# Shared by every solve in this process
+SOLVED = SolvedTable(int(os.environ.get("SOLVED_TABLE_MB", 32)) << 20)
+
+
+class _Solver:
+    def __init__(
+        self,
+        game: BitboardGame,
+        table: SolvedTable,
+        max_nodes: int,
+        deadline: float | None,
+        cancelled: Callable[[], bool] | None = None,
+    ):
+        self.game = game
+        self.table = table
+        self.max_nodes = max_nodes
+        self.deadline = deadline
+        self.cancelled = cancelled
+        self.nodes = 0
+        self.path: set[int] = set()
+
+    def solve(
+        self, position: SearchPosition, alpha: int, beta: int
+    ) -> tuple[float, int | None, bool]:
+        """Return the value, best move, and whether the value is path free.
+
+        Values depending on a repetition of a position earlier on the path
+        are not stored, since they can differ when reached another way.
+        """
+        self.nodes += 1
+        if self.nodes > self.max_nodes:
+            raise SolverGaveUp
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SolverGaveUp
+        if (
+            self.cancelled is not None
+            and not self.nodes % CANCEL_CHECK_NODES
+            and self.cancelled()
+        ):
+            raise SolverGaveUp
+
+        if position.key in self.path:
+            return self.game.config.repetition_score, None, False
+
+        game = self.game
+        solved = self.table.get(game, position)
+        if solved is not None:
+            return solved[0], solved[1], True
+
+        player = position.current_player
+        moves = game.legal_move_indices(position)
+        if not moves:
+            self.table.put(game, position, 0, None)
+            return 0, None, True
+
+        for move in moves:
+            if position.threats.counts[player][move]:
+                self.table.put(game, position, 1, move)
+                return 1, move, True
+
+        alpha_orig = alpha
+        value = -2
+        best_move = None
+        path_free = True
+        self.path.add(position.key)
+        try:
+            for move in order_moves(game, position, moves):
+                position.make_move(move)
+                try:
+                    score, _, child_path_free = self.solve(position, -beta, -alpha)
+                finally:
+                    position.unmake_move()
+                score = -score
+                path_free = path_free and child_path_free
+
+                if score > value:
+                    value = score
+                    best_move = move
+                alpha = max(alpha, value)
+                if alpha >= beta:
+                    break
+        finally:
+            self.path.remove(position.key)
+
+        # Only the best and worst values are exact outside the window
+        exact = alpha_orig < value < beta or abs(value) == 1
+        if exact and path_free:
+            self.table.put(game, position, value, best_move)
+        return value, best_move, path_free
+
+
+def solve(
+    game: BitboardGame,
+    state: BitboardState,
+    max_nodes: int = MAX_SOLVER_NODES,
+    deadline: float | None = None,
+    table: SolvedTable = SOLVED,
+    cancelled: Callable[[], bool] | None = None,
+) -> tuple[tuple[int, int] | None, float]:
+    """Solve the position, returning the best move and its exact value.
+
+    Raises `SolverGaveUp` past `max_nodes` or `deadline`, or once
+    `cancelled()` is true.
+    """
+    solver = _Solver(game, table, max_nodes, deadline, cancelled)
+    value, move, _ = solver.solve(game.search_position(state), -1, 1)
+    if move is None:
+        return None, value
+    return divmod(move, game.config.cols), value
+
+
+def test_solve_matches_minimax():
+    """Test solved values against plain minimax searched deep enough to
+    reach the end of every line, on 4x4 endgames."""
+    # Positions and the depths at which minimax finds their value
+    positions = [
+        (BitboardState((34258, 28713), 0), 10),
+        (BitboardState((49159, 11704), 0), 10),
+        (BitboardState((1059, 52124), 0), 10),
+        # Won through a long line of captures
+        (BitboardState((28934, 2737), 0), 14),
+        # Drawn, or lost by avoiding repetitions
+        (BitboardState((49460, 14984), 0), 10),
+    ]
+    values = {}
+    for repetition_score in [0.0, -0.5]:
+        config = GameConfig(
+            players=2, rows=4, cols=4, repetition_score=repetition_score
+        )
+        game = BitboardGame(config)
+        table = SolvedTable()
+        for state, depth in positions:
+            _, expected = search_root(game, state, depth, "minimax")
+            _, value = solve(game, state, table=SolvedTable())
+            assert value == expected, (state, repetition_score, value, expected)
+            # And again with the results of other solves in the table
+            _, value = solve(game, state, table=table)
+            assert value == expected, (state, repetition_score, value, expected)
+            values[repetition_score, state] = value
+    state, _ = positions[-1]
+    assert values[0.0, state] != values[-0.5, state]
+
+
+if __name__ == "__main__":
+    test_solve_matches_minimax()
@@ -0,0 +1,171 @@
+"""Evaluation functions for Complete The Square positions.
+
+Each heuristic scores a `SearchPosition` from the point of view of the
+player to move, roughly in [-1, 1]. `evaluate` combines them with weights,
+so new heuristics only need registering.
+"""
+
+from typing import Callable
+
+from bitboard import BitboardGame, SearchPosition, iter_bits
+
+Heuristic = Callable[[BitboardGame, SearchPosition], float]
+
+HEURISTICS: dict[str, Heuristic] = {}
+
+# Used when neither the request nor the game config sets weights
+DEFAULT_WEIGHTS = {"threats": 1.0, "open_squares": 0.3, "piece_fraction": 0.2}
+
+# Evaluations stay below a win, so the search always prefers a real one
+MAX_EVALUATION = 0.95
+
+
+def register_heuristic(name: str):
+    """Register an evaluation function under `name`."""
+
+    def decorator(function: Heuristic) -> Heuristic:
+        HEURISTICS[name] = function
+        return function
+
+    return decorator
+
+
+def resolve_weights(*weights: dict[str, float] | None) -> dict[str, float]:
+    """Merge weights, later ones overriding, falling back to the defaults."""
+    merged = {}
+    for overrides in weights:
+        if overrides:
+            merged.update(overrides)
+    if not merged:
+        merged = dict(DEFAULT_WEIGHTS)
+
+    unknown = set(merged) - set(HEURISTICS)
+    if unknown:
+        raise ValueError(f"Unknown heuristics: {', '.join(sorted(unknown))}")
+    return {name: float(weight) for name, weight in merged.items() if weight}
+
+
+def evaluate(
+    game: BitboardGame, position: SearchPosition, weights: dict[str, float]
+) -> float:
+    """Weighted sum of heuristics, for resolved `weights`."""
+    value = 0.0
+    for name, weight in weights.items():
+        value += weight * HEURISTICS[name](game, position)
+    return max(-MAX_EVALUATION, min(MAX_EVALUATION, value))
+
+
+def _opponents_board(position: SearchPosition) -> int:
+    others = 0
+    for player, board in enumerate(position.boards):
+        if player != position.current_player:
+            others |= board
+    return others
+
+
+@register_heuristic("piece_fraction")
+def piece_fraction(game: BitboardGame, position: SearchPosition) -> float:
+    """Share of the pieces on the board, centred on zero."""
+    total = position.occupied.bit_count()
+    if not total:
+        return 0.0
+    own = position.boards[position.current_player].bit_count()
+    return (2 * own - total) / total
+
+
+@register_heuristic("threats")
+def threats(game: BitboardGame, position: SearchPosition) -> float:
+    """Squares one move from completion, from the threat index."""
+    # The player to move completes one of their own at once, but can block
+    # only one of the opponent's winning squares
+    index = position.threats
+    player = position.current_player
+    if index.squares[player]:
+        return 1.0
+    opponent_squares = 0
+    for other, squares in enumerate(index.squares):
+        if other != player:
+            opponent_squares |= squares
+    if opponent_squares.bit_count() > 1:
+        return -1.0
+
+    own = index.totals[player]
+    total = sum(index.totals)
+    return 0.5 * (2 * own - total) / total if total > 0 else 0.0
+
+
+@register_heuristic("open_squares")
+def open_squares(game: BitboardGame, position: SearchPosition) -> float:
+    """Squares still completable by one side only, weighted by corners held."""
+    own = position.boards[position.current_player]
+    others = _opponents_board(position)
+    occupied = own | others
+
+    masks = game.corner_masks
+    if occupied.bit_count() * 4 < game.config.rows * game.config.cols:
+        # Only masks with a piece on them count, which on a sparse board are
+        # quicker to find from the pieces. Each is taken at its lowest piece
+        masks = [
+            mask
+            for square in iter_bits(occupied)
+            for mask in game.square_corner_masks[square]
+            if (mask & occupied) & -(mask & occupied) == 1 << square
+        ]
+
+    score = 0
+    total = 0
+    for mask in masks:
+        own_corners = own & mask
+        other_corners = others & mask
+        if own_corners and not other_corners:
+            score += own_corners.bit_count()
+        elif other_corners and not own_corners:
+            score -= other_corners.bit_count()
+        else:
+            continue
+        total += 3
+    return score / total if total else 0.0
+
+
+@register_heuristic("capture_vulnerability")
+def capture_vulnerability(game: BitboardGame, position: SearchPosition) -> float:
+    """Pieces the player to move can capture, less those the opponents can."""
+    boards = position.boards
+    player = position.current_player
+
+    attack = 0
+    defence = 0
+    for square in iter_bits(game.empty_squares(position)):
+        for other in range(game.config.players):
+            for _, captured in game.capture_masks(square, boards, other):
+                if other == player:
+                    attack |= captured
+                else:
+                    defence |= captured
+
+    total = position.occupied.bit_count()
+    if not total:
+        return 0.0
+    return (attack.bit_count() - defence.bit_count()) / total
+
+
+@register_heuristic("mobility")
+def mobility(game: BitboardGame, position: SearchPosition) -> float:
+    """Empty squares that still help complete a square, compared by side."""
+    own = position.boards[position.current_player]
+    others = _opponents_board(position)
+
+    own_useful = 0
+    other_useful = 0
+    for mask in game.corner_masks:
+        if not mask & others:
+            own_useful |= mask
+        if not mask & own:
+            other_useful |= mask
+
+    empty = game.empty_squares(position)
+    if not empty:
+        return 0.0
+    own_moves = (own_useful & empty).bit_count()
+    other_moves = (other_useful & empty).bit_count()
+    return (own_moves - other_moves) / empty.bit_count()
@@ -1,38 +1,106 @@
+import json
+import math
 import os
+import time
+from concurrent.futures import TimeoutError
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
 
-from bitboard import BitboardGame, BitboardState, GameConfig
-from minimax import find_best_move
+import metrics
+from search_pool import PoolBusy
+from service import (
+    CORS_ORIGINS,
+    DEFAULT_BUDGET_MS,
+    MAX_BATCH_SIZE,
+    SEARCH_TIMEOUT_MS,
+    BadRequest,
+    batch_moves,
+    cancel_search,
+    configure_logging,
+    known_move,
+    move_cache,
+    observe_request,
+    parse_move_search,
+    searched_move,
+    submit_search,
+)
+
+configure_logging()
 
 app = Flask(__name__)
 CORS(
     app,
-    origins=[
-        "https://guppy16.github.io",
-        "http://localhost:3000",
-        "http://0.0.0.0:3000",
-    ],
+    origins=CORS_ORIGINS,
     methods=["GET", "POST", "OPTIONS"],
     allow_headers=["Content-Type"],
 )
 
-# Set up your game config
-config = GameConfig(players=2, rows=5, cols=5)
-game = BitboardGame(config)
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    # Label by route pattern rather than path, so unknown paths share one
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    started = g.started
+
+    def record():
+        observe_request(route, response.status_code, time.perf_counter() - started)
+
+    if response.is_streamed:
+        # Streamed responses (/ai-moves) are still being generated
+        response.call_on_close(record)
+    else:
+        record()
+    return response
 
 
 @app.route("/ai-move", methods=["POST"])
 def ai_move():
     data = request.json
-    print(data)
-    state = BitboardState(
-        boards=tuple(data["boards"]),
-        current_player=data["current_player"],
-    )
-    best_move = find_best_move(game, state, depth=3)
-    return jsonify({"move": best_move})
+    try:
+        search = parse_move_search(data)
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
+
+    known = known_move(search)
+    if known is not None:
+        return jsonify(known)
+
+    try:
+        future = submit_search(search)
+    except PoolBusy:
+        retry_after = str(math.ceil(DEFAULT_BUDGET_MS / 1000))
+        return jsonify({"error": "Server busy"}), 503, {"Retry-After": retry_after}
+
+    try:
+        result = future.result(timeout=SEARCH_TIMEOUT_MS / 1000)
+    except TimeoutError:
+        cancel_search(future)
+        return jsonify({"error": "Search timed out"}), 504
+
+    return jsonify(searched_move(search, result))
+
+
+@app.route("/ai-moves", methods=["POST"])
+def ai_moves():
+    """Search a JSON array of `/ai-move` requests, streaming NDJSON results.
+
+    Each line has the `index` of its request in the array, in the order
+    the results finish.
+    """
+    data = request.json
+    if not isinstance(data, list):
+        return jsonify({"error": "Expected a JSON array of move requests"}), 400
+    if len(data) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} moves per batch"}), 400
+
+    lines = (json.dumps(result) + "\n" for result in batch_moves(data))
+    return Response(lines, mimetype="application/x-ndjson")
 
 
 @app.route("/", methods=["GET"])
@@ -40,6 +108,16 @@ def index():
     return jsonify({"message": "Welcome to the Bitboard Game API!"})
 
 
+@app.route("/cache-stats", methods=["GET"])
+def cache_stats():
+    return jsonify(move_cache.stats())
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
+
 @app.route("/health", methods=["GET"])
 def health():
     return jsonify({"status": "healthy"}), 200
@@ -0,0 +1,316 @@
+"""Monte Carlo tree search for Complete The Square.
+
+An alternative to the minimax search that scales with time rather than
+depth: UCT selection, random playouts (batched with `rollout.BatchRollout`
+on boards of up to 64 squares) and reuse of the tree between moves.
+"""
+
+import math
+import random
+import time
+from typing import Callable
+
+from bitboard import BitboardGame, BitboardState, GameConfig
+from minimax import SearchResult, SearchStats
+from rollout import BatchRollout
+
+# Exploration constant of the UCT formula
+EXPLORATION = 1.4
+# Leaves selected per batch of playouts. Nodes on the way to a leaf count as
+# visited as soon as it is selected (a virtual loss), which spreads each
+# batch over different lines
+LEAF_BATCH = 32
+
+
+class Node:
+    __slots__ = (
+        "state",
+        "parent",
+        "move",
+        "mover",
+        "won",
+        "children",
+        "untried",
+        "visits",
+        "wins",
+    )
+
+    def __init__(
+        self,
+        state: BitboardState,
+        parent: "Node | None" = None,
+        move: int | None = None,
+        won: bool = False,
+    ):
+        self.state = state
+        self.parent = parent
+        self.move = move
+        # The player who made the move into this node
+        self.mover = None if parent is None else parent.state.current_player
+        self.won = won
+        self.children: list[Node] = []
+        self.untried: list[int] | None = None  # Moves not expanded yet
+        self.visits = 0
+        self.wins = 0.0  # For the mover, with draws counting 1 / players
+
+
+class MCTS:
+    """Tree search that keeps its tree between moves of the same game."""
+
+    def __init__(
+        self,
+        game: BitboardGame,
+        exploration: float = EXPLORATION,
+        leaf_batch: int = LEAF_BATCH,
+        seed: int | None = None,
+    ):
+        self.game = game
+        self.exploration = exploration
+        self.leaf_batch = leaf_batch
+        self.random = random.Random(seed)
+        self.rollout = None
+        if game.config.rows * game.config.cols <= 64:
+            self.rollout = BatchRollout(game, seed)
+        self.root: Node | None = None
+
+    def set_root(self, state: BitboardState) -> Node:
+        """Start from the state, reusing the subtree if the tree has it.
+
+        Looks through the moves since the last search, as far as the reply
+        to our last move.
+        """
+        layer = [self.root] if self.root is not None else []
+        for _ in range(3):
+            for node in layer:
+                if node.state == state:
+                    node.parent = None
+                    self.root = node
+                    return node
+            layer = [child for node in layer for child in node.children]
+
+        self.root = Node(state)
+        return self.root
+
+    def _expand(self, node: Node) -> Node:
+        """Select a leaf below the node, expanding one new child."""
+        game = self.game
+        while not node.won:
+            if node.untried is None:
+                node.untried = self._candidate_moves(node.state)
+                self.random.shuffle(node.untried)
+
+            if node.untried:
+                move = node.untried.pop()
+                state, won = game.play_move_index(move, node.state)
+                child = Node(state, node, move, won)
+                node.children.append(child)
+                return child
+            if not node.children:
+                return node  # Full board
+
+            log_visits = math.log(node.visits)
+            node = max(node.children, key=lambda child: self._uct(child, log_visits))
+        return node
+
+    def _candidate_moves(self, state: BitboardState) -> list[int]:
+        """Legal moves, less those that lose straight away.
+
+        A winning move is the only one worth trying. Against a threat of the
+        next player, only moves on a threatened square or that capture can
+        stop it.
+        """
+        game = self.game
+        player = state.current_player
+        moves = game.legal_move_indices(state)
+        counts = game.threat_index(state).counts
+        for move in moves:
+            if counts[player][move]:
+                return [move]
+
+        threats = counts[(player + 1) % game.config.players]
+        if not any(threats[move] for move in moves):
+            return moves
+        return [
+            move
+            for move in moves
+            if threats[move] or game.capture_masks(move, state.boards, player)
+        ]
+
+    def _uct(self, child: Node, log_visits: float) -> float:
+        return child.wins / child.visits + self.exploration * math.sqrt(
+            log_visits / child.visits
+        )
+
+    def _playouts(self, leaves: list[Node]) -> list[int]:
+        """Winner of a random playout from each leaf, or -1 for a draw."""
+        winners = [-1] * len(leaves)
+        pending = []
+        for i, leaf in enumerate(leaves):
+            if leaf.won:
+                winners[i] = leaf.mover
+            elif self.game.empty_squares(leaf.state):
+                pending.append(i)
+
+        if self.rollout is not None:
+            results = self.rollout.rollout_states([leaves[i].state for i in pending])
+            for i, winner in zip(pending, results.tolist()):
+                winners[i] = winner
+        else:
+            for i in pending:
+                winners[i] = self._playout(leaves[i].state)
+        return winners
+
+    def _playout(self, state: BitboardState) -> int:
+        game = self.game
+        for _ in range(4 * game.config.rows * game.config.cols):
+            moves = game.legal_move_indices(state)
+            if not moves:
+                break
+            state, won = game.play_move_index(self.random.choice(moves), state)
+            if won:
+                return state.current_player
+        return -1
+
+    def _iterate(self, root: Node):
+        """Select a batch of leaves, play out from them, and back up the results."""
+        leaves = []
+        for _ in range(self.leaf_batch):
+            leaf = self._expand(root)
+            leaves.append(leaf)
+            node = leaf
+            while node is not None:
+                node.visits += 1
+                node = node.parent
+
+        draw = 1 / self.game.config.players
+        for leaf, winner in zip(leaves, self._playouts(leaves)):
+            node = leaf
+            while node is not None:
+                if winner == -1:
+                    node.wins += draw
+                elif winner == node.mover:
+                    node.wins += 1
+                node = node.parent
+
+    def search(
+        self,
+        state: BitboardState,
+        budget_ms: float | None = None,
+        iterations: int | None = None,
+        cancelled: Callable[[], bool] | None = None,
+    ) -> SearchResult:
+        """Search until the time budget or number of playouts runs out, or
+        `cancelled()` is true.
+
+        With neither limit, plays 1000 playouts. The score is the expected result
+        of the best move, from -1 (loss) to 1 (win) for the player to move.
+        The stats count playouts as nodes.
+        """
+        if budget_ms is None and iterations is None:
+            iterations = 1000
+        start = time.perf_counter()
+        deadline = None
+        if budget_ms is not None:
+            deadline = start + budget_ms / 1000
+
+        root = self.set_root(state)
+        start_visits = root.visits
+        while True:
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            if iterations is not None and root.visits - start_visits >= iterations:
+                break
+            if cancelled is not None and cancelled():
+                break
+            if root.won or not self.game.empty_squares(state):
+                break
+            self._iterate(root)
+
+        result = self.best_move(root)
+        result.stats = SearchStats(
+            nodes=root.visits - start_visits, elapsed=time.perf_counter() - start
+        )
+        return result
+
+    def best_move(self, root: Node) -> SearchResult:
+        """The most visited move at the root."""
+        if not root.children:
+            return SearchResult(None, 0.0, 0)
+        best = max(root.children, key=lambda child: child.visits)
+        return SearchResult(
+            divmod(best.move, self.game.config.cols),
+            2 * best.wins / best.visits - 1,
+            tree_depth(best) + 1,
+            solved=best.won,
+        )
+
+
+def tree_depth(node: Node) -> int:
+    """Length of the most visited line below the node."""
+    depth = 0
+    while node.children:
+        node = max(node.children, key=lambda child: child.visits)
+        depth += 1
+    return depth
+
+
+def test_set_root_reuses_tree():
+    """Test that the tree is kept for the positions after the next moves."""
+    game = BitboardGame(GameConfig(players=2, rows=5, cols=5))
+    engine = MCTS(game, seed=0)
+    root = engine.set_root(game.new_game_state())
+    engine.search(root.state, iterations=500)
+
+    child = max(root.children, key=lambda node: node.visits)
+    reply = max(child.children, key=lambda node: node.visits)
+    visits = reply.visits
+    assert engine.set_root(reply.state) is reply
+    assert reply.parent is None and reply.visits == visits
+
+    engine.search(reply.state, iterations=100)
+    assert reply.visits >= visits + 100
+
+    other = BitboardState((1, 2), 0)
+    node = engine.set_root(other)
+    assert node is not reply and node.visits == 0 and not node.children
+
+
+def test_candidate_moves():
+    """Test that only a winning move, or moves that stop a threat, are tried."""
+    game = BitboardGame(GameConfig(players=2, rows=5, cols=5))
+    engine = MCTS(game, seed=0)
+    # Player 0 has three corners of the square (0, 0) to (2, 2)
+    threat = 1 << 0 | 1 << 2 | 1 << 10
+
+    state = BitboardState((threat, 1 << 23 | 1 << 24), 0)
+    assert engine._candidate_moves(state) == [12]
+    # Player 1 can only take the last corner
+    state = BitboardState((threat, 1 << 23 | 1 << 24), 1)
+    assert engine._candidate_moves(state) == [12]
+    # Or capture (0, 2) by playing (0, 1)
+    state = BitboardState((threat, 1 << 3 | 1 << 24), 1)
+    assert sorted(engine._candidate_moves(state)) == [1, 12]
+    # Without threats every move is tried
+    state = BitboardState((1 << 0, 1 << 24), 0)
+    assert sorted(engine._candidate_moves(state)) == game.legal_move_indices(state)
+
+
+def test_search_wins_and_blocks():
+    """Test that the search takes a win in one and blocks a threat."""
+    game = BitboardGame(GameConfig(players=2, rows=5, cols=5))
+    threat = 1 << 0 | 1 << 2 | 1 << 10
+
+    result = MCTS(game, seed=0).search(
+        BitboardState((threat, 1 << 23 | 1 << 24), 0), iterations=200
+    )
+    assert result.move == (2, 2) and result.solved
+    result = MCTS(game, seed=0).search(
+        BitboardState((threat, 1 << 23 | 1 << 24), 1), iterations=200
+    )
+    assert result.move == (2, 2)
+
+
+if __name__ == "__main__":
+    test_set_root_reuses_tree()
+    test_candidate_moves()
+    test_search_wins_and_blocks()
@@ -0,0 +1,97 @@
+"""Counters and histograms exposed in the Prometheus text format.
+
+requests = Counter("http_requests_total", "Requests handled", ("route",))
+requests.inc(route="/ai-move")
+print(render())
+"""
+
+import bisect
+import threading
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds, from a cache hit to a long search
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Every metric, in the order they are rendered
+REGISTRY: list["Counter | Histogram"] = []
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values: dict[tuple[str, ...], float] = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # Per label values: the count in each bucket (not cumulative), then
+        # the sum and count of all observations
+        self.values: dict[tuple[str, ...], tuple[list[int], float, int]] = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self.lock:
+            counts, total, count = self.values.get(
+                key, ([0] * (len(self.buckets) + 1), 0.0, 0)
+            )
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.values[key] = (counts, total + value, count + 1)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, (counts, total, count) in sorted(self.values.items()):
+                cumulative = 0
+                bounds = [*map(str, self.buckets), "+Inf"]
+                for bound, bucket_count in zip(bounds, counts):
+                    cumulative += bucket_count
+                    labels = _labels(self.labels, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _labels(self.labels, key)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -1,15 +1,31 @@
 """Minimax algorithm for Complete The Square game."""
 
+import random
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from statistics import mean, median
-from typing import Literal
+from typing import TYPE_CHECKING, Callable, Literal
 
-from bitboard import BitboardGame, BitboardState, GameConfig
+from bitboard import BitboardGame, BitboardState, GameConfig, SearchPosition
+from evaluation import evaluate, resolve_weights
+from transposition import EXACT, LOWER, UPPER, TranspositionTable
+
+if TYPE_CHECKING:
+    from opening_book import OpeningBook
 
 
 def heuristic(
-    state: BitboardState, heuristic_type: Literal["simple", "piece_fraction"]
+    state: BitboardState | SearchPosition,
+    heuristic_type: Literal["simple", "piece_fraction"],
 ) -> float:
-    """Heuristic evaluation function for the game state."""
+    """Heuristic evaluation function for the game state.
+
+    Used by plain `minimax`; `alphabeta` uses the weighted heuristics of
+    `evaluation.evaluate`.
+    """
 
     if heuristic_type == "simple":
         # Simple heuristic: return 0.0 for simplicity
@@ -32,7 +48,9 @@ def minimax(
 ) -> float:
 
     if state in visited:
-        return -0.1  # Already visited state, return draw value
+        # Already visited state, scored for the player to move like a draw
+        score = game.config.repetition_score
+        return score if maximizing_player else -score
     visited.add(state)
 
     if depth == 0:
@@ -66,33 +84,651 @@ def minimax(
     return value  # Return draw value if no winning move found
 
 
-def find_best_move(
+WIN_SCORE = 1.0
+
+
+# Move scores from `score_moves`: a win, a block, and one captured piece
+WIN_MOVE = 1 << 20
+BLOCK_MOVE = 1 << 16
+CAPTURE_MOVE = 16
+
+
+def order_moves(
+    game: BitboardGame, position: SearchPosition, moves: list[int]
+) -> list[int]:
+    """Order square indices best-first: immediate wins, blocks, captures, then
+    threats."""
+    return [move for _, move in score_moves(game, position, moves)]
+
+
+def score_moves(
+    game: BitboardGame, position: SearchPosition, moves: list[int]
+) -> list[tuple[int, int]]:
+    """`(score, move)` pairs best-first, see `order_moves`.
+
+    Moves scoring below `CAPTURE_MOVE` neither win, block nor capture.
+    """
+
+    player = position.current_player
+    boards = position.boards
+    own = boards[player]
+    others = position.occupied & ~own
+    threats = position.threats
+    opponent_squares = 0
+    for other, squares in enumerate(threats.squares):
+        if other != player:
+            opponent_squares |= squares
+
+    def score(move: int) -> int:
+        masks = game.square_corner_masks[move]
+
+        if threats.counts[player][move]:
+            return WIN_MOVE
+        if opponent_squares >> move & 1:
+            return BLOCK_MOVE  # Stops the opponent completing a square
+
+        # Number of opponent pieces the move would capture
+        captures = sum(
+            captured.bit_count()
+            for _, captured in game.capture_masks(move, boards, player)
+        )
+
+        # Own corners already on squares the move extends, and opponent
+        # squares the move blocks
+        corners = 0
+        for mask in masks:
+            if mask & others == 0:
+                corners += (own & mask).bit_count()
+            elif mask & own == 0:
+                corners += (others & mask).bit_count()
+
+        return captures * CAPTURE_MOVE + corners
+
+    scored = [(score(move), move) for move in moves]
+    scored.sort(key=lambda pair: pair[0], reverse=True)
+    return scored
+
+
+# Late move reductions: quiet moves after the first few are searched less
+# deeply, and again at full depth only if they beat alpha. On large boards
+# most moves are quiet, so this is what keeps the search deepening
+LMR_MIN_DEPTH = 3
+LMR_FULL_MOVES = 3
+
+
+def late_move_reduction(depth: int, index: int, move_score: int) -> int:
+    """Plies to take off the search of the move at `index` in the ordering."""
+    if depth < LMR_MIN_DEPTH or index < LMR_FULL_MOVES or move_score >= CAPTURE_MOVE:
+        return 0
+    if index < 4 * LMR_FULL_MOVES:
+        return 1
+    return min(2, depth - 2)
+
+
+@dataclass
+class SearchStats:
+    """Counters of a search, over all of its iterations.
+
+    With `timings`, also the seconds spent in `make_move`, move generation
+    and evaluation, which costs a little time per node to measure.
+    """
+
+    nodes: int = 0
+    tt_probes: int = 0
+    tt_hits: int = 0  # Probes that found the position
+    cutoffs: int = 0
+    elapsed: float = 0.0  # Seconds
+    timings: dict[str, float] | None = None
+
+    @classmethod
+    def timed(cls) -> "SearchStats":
+        return cls(timings={"play_move": 0.0, "legal_moves": 0.0, "heuristic": 0.0})
+
+    def as_dict(self) -> dict[str, object]:
+        stats = {
+            "nodes": self.nodes,
+            "nps": round(self.nodes / self.elapsed) if self.elapsed else 0,
+            "tt_hit_rate": self.tt_hits / self.tt_probes if self.tt_probes else 0.0,
+            "cutoffs": self.cutoffs,
+            "elapsed_ms": self.elapsed * 1000,
+        }
+        if self.timings is not None:
+            stats["timings_ms"] = {
+                name: seconds * 1000 for name, seconds in self.timings.items()
+            }
+        return stats
+
+
+# Repetition depth of a subtree that repeats no earlier position
+NO_REPETITION = 1 << 30
+# Nodes between checks of whether a search was cancelled
+CANCEL_CHECK_NODES = 1024
+
+
+@dataclass
+class SearchContext:
+    """State shared by every node of one alpha-beta search."""
+
+    game: BitboardGame
+    table: TranspositionTable
+    weights: dict[str, float]  # Resolved, see `evaluation.resolve_weights`
+    deadline: float | None = None
+    # Whether to stop the search, checked every `CANCEL_CHECK_NODES` nodes
+    cancelled: Callable[[], bool] | None = None
+    # Keys of the positions from the root to the current node
+    path: list[int] = field(default_factory=list)
+    on_path: set[int] = field(default_factory=set)
+    # Shallowest index into `path` that a repetition in the subtree returned to
+    repetition_ply: int = NO_REPETITION
+    stats: SearchStats = field(default_factory=SearchStats)
+
+
+def alphabeta(
+    context: SearchContext,
+    position: SearchPosition,
+    depth: int,
+    alpha: float,
+    beta: float,
+) -> float:
+    """Negamax search with alpha-beta pruning and a transposition table.
+
+    Moves are made and unmade on `position`, which is left unchanged on
+    return. Scores are from the point of view of the player to move in
+    `position`. Leaves are scored with `evaluation.evaluate`, or the "simple"
+    heuristic without weights. A position that repeats one on the path
+    scores `GameConfig.repetition_score`.
+
+    Quiet moves late in the ordering are first searched to a reduced depth,
+    see `late_move_reduction`.
+
+    Scores that depend on a repetition of a position above the node depend
+    on the path to it, so they are not stored in the transposition table.
+    Raises `SearchTimeout` once `time.perf_counter()` passes the deadline,
+    or once the search is cancelled.
+    """
+
+    if context.deadline is not None and time.perf_counter() > context.deadline:
+        raise SearchTimeout
+
+    game = context.game
+    stats = context.stats
+    timings = stats.timings
+    stats.nodes += 1
+    if (
+        context.cancelled is not None
+        and not stats.nodes % CANCEL_CHECK_NODES
+        and context.cancelled()
+    ):
+        raise SearchTimeout
+    key = position.key
+    if key in context.on_path:
+        context.repetition_ply = min(context.repetition_ply, context.path.index(key))
+        return game.config.repetition_score
+
+    if depth == 0:
+        if timings is not None:
+            started = time.perf_counter()
+        if context.weights:
+            value = evaluate(game, position, context.weights)
+        else:
+            value = heuristic(position, "simple")
+        if timings is not None:
+            timings["heuristic"] += time.perf_counter() - started
+        return value
+
+    table = context.table
+    entry = table.probe(key)
+    stats.tt_probes += 1
+    tt_move = None
+    if entry is not None:
+        stats.tt_hits += 1
+        tt_move = entry.move
+        if entry.depth >= depth:
+            if entry.bound == EXACT:
+                return entry.value
+            if entry.bound == LOWER and entry.value >= beta:
+                return entry.value
+            if entry.bound == UPPER and entry.value <= alpha:
+                return entry.value
+
+    if timings is not None:
+        started = time.perf_counter()
+    legal_moves = game.legal_move_indices(position)
+    if timings is not None:
+        timings["legal_moves"] += time.perf_counter() - started
+    if not legal_moves:
+        return 0.0
+
+    moves = score_moves(game, position, legal_moves)
+    if tt_move is not None:
+        # The best move from an earlier visit is the most likely cutoff
+        for index, (move_score, move) in enumerate(moves):
+            if move == tt_move:
+                moves.insert(0, moves.pop(index))
+                break
+
+    ply = len(context.path)
+    context.path.append(key)
+    context.on_path.add(key)
+    outer_repetition_ply = context.repetition_ply
+    context.repetition_ply = NO_REPETITION
+
+    alpha_orig = alpha
+    value = float("-inf")
+    best_move = None
+    try:
+        for index, (move_score, move) in enumerate(moves):
+            if timings is not None:
+                started = time.perf_counter()
+            won = position.make_move(move)
+            if timings is not None:
+                timings["play_move"] += time.perf_counter() - started
+            if won:
+                position.unmake_move()
+                value = WIN_SCORE  # Nothing beats winning on the spot
+                best_move = move
+                break
+
+            try:
+                reduction = late_move_reduction(depth, index, move_score)
+                if reduction:
+                    score = -alphabeta(
+                        context, position, depth - 1 - reduction, -beta, -alpha
+                    )
+                if not reduction or score > alpha:
+                    score = -alphabeta(context, position, depth - 1, -beta, -alpha)
+            finally:
+                position.unmake_move()
+
+            if score > value:
+                value = score
+                best_move = move
+            if value > alpha:
+                alpha = value
+            if alpha >= beta:
+                stats.cutoffs += 1
+                break  # Cutoff: the opponent will avoid this line
+    finally:
+        context.path.pop()
+        context.on_path.remove(key)
+        repetition_ply = context.repetition_ply
+        context.repetition_ply = min(outer_repetition_ply, repetition_ply)
+
+    if repetition_ply >= ply:
+        if value <= alpha_orig:
+            bound = UPPER
+        elif value >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        table.store(key, depth, bound, value, best_move)
+
+    return value
+
+
+class SearchTimeout(Exception):
+    """Raised inside a search that has run past its deadline."""
+
+
+@dataclass
+class SearchResult:
+    move: tuple[int, int]
+    score: float  # From the point of view of the player to move
+    depth: int  # Depth of the deepest completed search
+    solved: bool = False  # Exact result from the endgame solver
+    stats: SearchStats | None = None
+    # Time the search had, when less than asked for, e.g. after waiting
+    budget_ms: float | None = None
+
+
+def search_root(
     game: BitboardGame,
     state: BitboardState,
     depth: int,
-) -> tuple[int, int]:
+    search: Literal["minimax", "alphabeta"] = "alphabeta",
+    table: TranspositionTable | None = None,
+    deadline: float | None = None,
+    weights: dict[str, float] | None = None,
+    stats: SearchStats | None = None,
+    cancelled: Callable[[], bool] | None = None,
+) -> tuple[tuple[int, int] | None, float]:
+    """Search every root move to `depth` and return the best move and score.
+
+    `weights` override the evaluation weights of the game config. Alpha-beta
+    searches add their counters to `stats`, and raise `SearchTimeout` once
+    `cancelled()` is true.
+    """
 
     best_value = float("-inf")
     best_move = None
 
-    for move in game.legal_moves(state):
-        new_state, winner = game.play_move(move, state)
+    if table is None:
+        table = TranspositionTable()
+    weights = resolve_weights(game.config.weights, weights)
 
-        if winner:
-            return move  # Immediate winning move
+    if search == "alphabeta":
+        context = SearchContext(
+            game,
+            table,
+            weights,
+            deadline,
+            cancelled,
+            path=[state.key],
+            on_path={state.key},
+        )
+        if stats is not None:
+            context.stats = stats
+        context.stats.nodes += 1
+        position = game.search_position(state)
+        legal_moves = order_moves(game, position, game.legal_move_indices(state))
+        legal_moves = game.unique_moves(state, legal_moves)
+        entry = table.probe(state.key)
+        if entry is not None and entry.move in legal_moves:
+            # Best move of the previous iteration first
+            legal_moves.remove(entry.move)
+            legal_moves.insert(0, entry.move)
+    else:
+        legal_moves = game.legal_move_indices(state)
 
-        visited = set()
-        score = minimax(game, new_state, depth - 1, False, visited)
+    for move in legal_moves:
+        if search == "alphabeta":
+            if position.make_move(move):
+                return divmod(move, game.config.cols), WIN_SCORE  # Immediate win
+
+            score = -alphabeta(context, position, depth - 1, float("-inf"), -best_value)
+            position.unmake_move()
+        else:
+            new_state, winner = game.play_move_index(move, state)
+            if winner:
+                return divmod(move, game.config.cols), WIN_SCORE  # Immediate win
+            score = minimax(game, new_state, depth - 1, False, set())
 
         if score > best_value:
             best_value = score
             best_move = move
 
+    if best_move is None:
+        return None, best_value
+
+    if search == "alphabeta":
+        table.store(state.key, depth, EXACT, best_value, best_move)
+
+    return divmod(best_move, game.config.cols), best_value
+
+
+# Process pool for parallel root searches, and per-process search state
+_executor: ProcessPoolExecutor | None = None
+_executor_workers = 0
+_worker_games: dict[str, BitboardGame] = {}
+_worker_tables: dict[int, TranspositionTable] = {}
+
+
+def get_executor(workers: int) -> ProcessPoolExecutor:
+    """Return the persistent process pool, resized to `workers` if needed."""
+    global _executor, _executor_workers
+    if _executor is None or _executor_workers != workers:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = ProcessPoolExecutor(max_workers=workers)
+        _executor_workers = workers
+    return _executor
+
+
+def _search_root_move(
+    config: GameConfig,
+    state: BitboardState,
+    move: int,
+    depth: int,
+    alpha: float,
+    remaining: float | None,
+    weights: dict[str, float],
+    search_id: int,
+) -> float | None:
+    """Score one root move in a pool process, or None if out of time.
+
+    Moves of the same search share a transposition table in each process.
+    """
+    if repr(config) not in _worker_games:
+        _worker_games[repr(config)] = BitboardGame(config)
+    game = _worker_games[repr(config)]
+
+    if search_id not in _worker_tables:
+        while len(_worker_tables) >= 4:
+            del _worker_tables[next(iter(_worker_tables))]  # Oldest search
+        _worker_tables[search_id] = TranspositionTable()
+    table = _worker_tables[search_id]
+
+    deadline = None if remaining is None else time.perf_counter() + remaining
+    context = SearchContext(
+        game, table, weights, deadline, path=[state.key], on_path={state.key}
+    )
+    position = game.search_position(state)
+    position.make_move(move)
+    try:
+        return -alphabeta(context, position, depth - 1, float("-inf"), -alpha)
+    except SearchTimeout:
+        return None
+
+
+def parallel_search_root(
+    game: BitboardGame,
+    state: BitboardState,
+    depth: int,
+    workers: int,
+    deadline: float | None = None,
+    weights: dict[str, float] | None = None,
+    search_id: int | None = None,
+) -> tuple[tuple[int, int] | None, float]:
+    """Like `search_root`, with root moves split across a process pool.
+
+    Up to `workers` moves are searched at once. Each new move is sent with
+    the best score so far as its alpha bound, so later moves still prune.
+    Calls with the same `search_id` share transposition tables.
+    """
+
+    weights = resolve_weights(game.config.weights, weights)
+    position = game.search_position(state)
+    legal_moves = order_moves(game, position, game.legal_move_indices(state))
+    legal_moves = game.unique_moves(state, legal_moves)
+    for move in legal_moves:
+        if position.threats.counts[state.current_player][move]:
+            return divmod(move, game.config.cols), WIN_SCORE  # Immediate win
+
+    executor = get_executor(workers)
+    if search_id is None:
+        search_id = time.perf_counter_ns()
+    best_value = float("-inf")
+    best_move = None
+
+    def submit(move: int):
+        remaining = None
+        if deadline is not None:
+            remaining = deadline - time.perf_counter()
+        return executor.submit(
+            _search_root_move,
+            game.config,
+            state,
+            move,
+            depth,
+            best_value,
+            remaining,
+            weights,
+            search_id,
+        )
+
+    pending = {}
+    moves = iter(legal_moves)
+    for move in moves:
+        pending[submit(move)] = move
+        if len(pending) >= workers:
+            break
+
+    try:
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                move = pending.pop(future)
+                score = future.result()
+                if score is None:
+                    raise SearchTimeout
+                # Equal scores keep the earlier move in the ordering
+                if score > best_value or (
+                    score == best_value
+                    and legal_moves.index(move) < legal_moves.index(best_move)
+                ):
+                    best_value = score
+                    best_move = move
+
+                next_move = next(moves, None)
+                if next_move is not None:
+                    pending[submit(next_move)] = next_move
+    finally:
+        for future in pending:
+            future.cancel()
+
+    if best_move is None:
+        return None, best_value
+    return divmod(best_move, game.config.cols), best_value
+
+
+def find_best_move(
+    game: BitboardGame,
+    state: BitboardState,
+    depth: int,
+    search: Literal["minimax", "alphabeta"] = "alphabeta",
+    table: TranspositionTable | None = None,
+    weights: dict[str, float] | None = None,
+    workers: int = 1,
+    book: "OpeningBook | None" = None,
+) -> tuple[int, int]:
+    """Return the best move for the player to move, searched to `depth`.
+
+    Positions in the opening `book` are answered without searching. With
+    `workers` > 1 the root moves are searched in parallel processes.
+    """
+
+    if book is not None:
+        book_move = book.lookup(game, state)
+        if book_move is not None:
+            return book_move
+
+    if workers > 1 and search == "alphabeta":
+        best_move, _ = parallel_search_root(game, state, depth, workers, None, weights)
+        return best_move if best_move else (0, 0)
+
+    if table is None:
+        table = TranspositionTable()
+    table.new_search()
+
+    best_move, _ = search_root(game, state, depth, search, table, weights=weights)
+
     return (
         best_move if best_move else (0, 0)
     )  # Return a default move if no moves available
 
 
+def iterative_deepening(
+    game: BitboardGame,
+    state: BitboardState,
+    budget_ms: float,
+    max_depth: int = 32,
+    table: TranspositionTable | None = None,
+    weights: dict[str, float] | None = None,
+    workers: int = 1,
+    solve_empty_squares: int | None = None,
+    timed: bool = False,
+    cancelled: Callable[[], bool] | None = None,
+) -> SearchResult:
+    """Search one ply deeper at a time until the time budget runs out.
+
+    Returns the best move of the deepest completed iteration. Depth 1 always
+    completes, so there is a move even when the budget is tiny. Iterations
+    deeper than 2 plies split their root moves over `workers` processes.
+
+    Positions with at most `solve_empty_squares` empty squares (default
+    `endgame.SOLVE_EMPTY_SQUARES`) are solved exactly if the solver can do
+    so within half the budget.
+
+    The result has the counters of the search, see `SearchStats`, which
+    also times the parts of the search with `timed`. Root moves searched in
+    other processes aren't counted.
+
+    Once `cancelled()` is true, e.g. as nobody waits for the result any
+    more, the search stops early like at the end of its budget.
+    """
+
+    start = time.perf_counter()
+    stats = SearchStats.timed() if timed else SearchStats()
+    deadline = start + budget_ms / 1000
+    search_id = time.perf_counter_ns()
+
+    if table is None:
+        table = TranspositionTable()
+    table.new_search()
+
+    # Imported here, as the solver orders its moves with this module
+    from endgame import SOLVE_EMPTY_SQUARES, SolverGaveUp, solve
+
+    if solve_empty_squares is None:
+        solve_empty_squares = SOLVE_EMPTY_SQUARES
+    empty_squares = game.empty_squares(state).bit_count()
+    if 0 < empty_squares <= solve_empty_squares:
+        # Solve exactly with up to half the budget, then fall back to searching
+        try:
+            move, value = solve(
+                game, state, deadline=start + budget_ms / 2000, cancelled=cancelled
+            )
+        except SolverGaveUp:
+            pass
+        else:
+            if move is not None:
+                stats.elapsed = time.perf_counter() - start
+                return SearchResult(
+                    move=move,
+                    score=value * WIN_SCORE,
+                    depth=empty_squares,
+                    solved=True,
+                    stats=stats,
+                )
+
+    result = SearchResult(move=(0, 0), score=0.0, depth=0)
+    for depth in range(1, max_depth + 1):
+        try:
+            if workers > 1 and depth > 2:
+                move, score = parallel_search_root(
+                    game, state, depth, workers, deadline, weights, search_id
+                )
+            else:
+                move, score = search_root(
+                    game,
+                    state,
+                    depth,
+                    table=table,
+                    deadline=deadline if depth > 1 else None,
+                    weights=weights,
+                    stats=stats,
+                    cancelled=cancelled,
+                )
+        except SearchTimeout:
+            break
+
+        if move is None:
+            break  # No legal moves
+        result = SearchResult(move=move, score=score, depth=depth)
+
+        if abs(score) >= WIN_SCORE:
+            break  # Forced result, deeper searches won't change it
+
+        # Each iteration takes several times longer than the last, so don't
+        # start one that can't finish
+        if time.perf_counter() - start > budget_ms / 1000 / 2:
+            break
+
+    stats.elapsed = time.perf_counter() - start
+    result.stats = stats
+    return result
+
+
 def play_minimax_game(
     game: BitboardGame,
     depth: int = 3,
@@ -123,7 +759,114 @@ def play_minimax_game(
             break
 
 
+# Weights that leave only the evaluation of plain minimax, which is 0 for
+# positions that aren't won
+MINIMAX_WEIGHTS = {"threats": 0}
+# Positions on 4x4 as (boards, player, depth) whose value at that depth
+# depends on `repetition_score`
+REPETITION_POSITIONS = [((38984, 17411), 1, 4), ((6728, 49414), 0, 5)]
+
+
+@contextmanager
+def no_reductions():
+    """Turn off late move reductions, which can change the search value."""
+    global LMR_MIN_DEPTH
+    lmr_min_depth = LMR_MIN_DEPTH
+    LMR_MIN_DEPTH = 1 << 30
+    try:
+        yield
+    finally:
+        LMR_MIN_DEPTH = lmr_min_depth
+
+
+def random_positions(
+    game: BitboardGame, count: int, rng: random.Random
+) -> list[BitboardState]:
+    """Positions after a few random moves, with moves left and no winner."""
+    positions = []
+    while len(positions) < count:
+        state = game.new_game_state()
+        for _ in range(rng.randrange(2, 12)):
+            moves = game.legal_move_indices(state)
+            if not moves:
+                break
+            next_state, won = game.play_move_index(rng.choice(moves), state)
+            if won:
+                break
+            state = next_state
+        if game.legal_move_indices(state):
+            positions.append(state)
+    return positions
+
+
+def test_alphabeta_matches_minimax():
+    """Test that alpha-beta, with and without a transposition table kept
+    across searches, finds the root value of plain minimax."""
+    values = {}
+    with no_reductions():
+        for repetition_score in [0.0, -0.5]:
+            config = GameConfig(
+                players=2, rows=4, cols=4, repetition_score=repetition_score
+            )
+            game = BitboardGame(config)
+            cases = [
+                (state, depth)
+                for state in random_positions(game, 10, random.Random(0))
+                for depth in [3, 4]
+            ]
+            cases += [
+                (BitboardState(boards, player), depth)
+                for boards, player, depth in REPETITION_POSITIONS
+            ]
+            shared = TranspositionTable()
+            for state, depth in cases:
+                _, expected = search_root(game, state, depth, "minimax")
+                _, fresh = search_root(
+                    game,
+                    state,
+                    depth,
+                    table=TranspositionTable(1),
+                    weights=MINIMAX_WEIGHTS,
+                )
+                shared.new_search()
+                _, reused = search_root(
+                    game, state, depth, table=shared, weights=MINIMAX_WEIGHTS
+                )
+                assert fresh == expected, (state, depth, fresh, expected)
+                assert reused == expected, (state, depth, reused, expected)
+                values[repetition_score, state, depth] = expected
+
+    # The repetition positions do test the scoring of repetitions
+    for boards, player, depth in REPETITION_POSITIONS:
+        state = BitboardState(boards, player)
+        assert values[0.0, state, depth] != values[-0.5, state, depth]
+
+
+def test_iterative_deepening():
+    """Test that iterative deepening ends with the value of plain minimax at
+    the depth it reached, and reaches the maximum depth unless forced."""
+    game = BitboardGame(GameConfig(players=2, rows=4, cols=4))
+    with no_reductions():
+        for state in random_positions(game, 10, random.Random(1)):
+            result = iterative_deepening(
+                game,
+                state,
+                budget_ms=1e9,
+                max_depth=4,
+                weights=MINIMAX_WEIGHTS,
+                solve_empty_squares=0,
+            )
+            assert result.depth == 4 or abs(result.score) >= WIN_SCORE, result
+            _, expected = search_root(game, state, result.depth, "minimax")
+            assert result.score == expected, (state, result, expected)
+            assert result.stats.nodes > 0
+
+
 if __name__ == "__main__":
-    config = GameConfig(players=2, rows=5, cols=5)
-    game = BitboardGame(config)
-    play_minimax_game(game, depth=3)
+    if sys.argv[1:] == ["--test"]:
+        test_alphabeta_matches_minimax()
+        test_iterative_deepening()
+    else:
+        config = GameConfig(players=2, rows=5, cols=5)
+        game = BitboardGame(config)
+        play_minimax_game(game, depth=3)
@@ -0,0 +1,107 @@
+"""Cache of AI moves by position, for the game server."""
+
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Hashable
+
+# Rough per-entry overhead of the dict, list and tuple objects, in bytes
+ENTRY_OVERHEAD = 200
+
+
+class MoveCache:
+    """Least recently used cache of search results, bounded in entries and size.
+
+    With a `path`, results are also written to an SQLite file, which every
+    server process on the host can share. Keys must be built from ints,
+    floats, strings and tuples so their `repr` is stable across processes.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        max_bytes: int = 64 << 20,
+        path: str | None = None,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[Hashable, tuple[object, int]] = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.lock = threading.Lock()
+
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS moves (key TEXT PRIMARY KEY, value BLOB)"
+            )
+            self.db.commit()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Whether the key is cached in memory, without counting a lookup."""
+        with self.lock:
+            return key in self.entries
+
+    def get(self, key: Hashable):
+        """Return the cached value for the key, or None."""
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+
+            if self.db is not None:
+                row = self.db.execute(
+                    "SELECT value FROM moves WHERE key = ?", (repr(key),)
+                ).fetchone()
+                if row is not None:
+                    value = pickle.loads(row[0])
+                    self._insert(key, value, len(row[0]))
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value):
+        """Cache the value, evicting the least recently used entries."""
+        blob = pickle.dumps(value)
+        with self.lock:
+            self._insert(key, value, len(blob))
+            if self.db is not None:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO moves VALUES (?, ?)", (repr(key), blob)
+                )
+                self.db.commit()
+
+    def _insert(self, key: Hashable, value, value_size: int):
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[1]
+        size = ENTRY_OVERHEAD + len(repr(key)) + value_size
+        self.entries[key] = (value, size)
+        self.bytes += size
+
+        while self.entries and (
+            len(self.entries) > self.max_entries or self.bytes > self.max_bytes
+        ):
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.bytes -= evicted_size
+
+    def stats(self) -> dict[str, int]:
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+            }
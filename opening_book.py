@@ -0,0 +1,151 @@
+"""Opening book of precomputed AI moves for Complete The Square.
+
+Build a book with deep searches of every position up to a number of plies:
+
+    python opening_book.py --plies 3 --depth 6 --output book.bin
+
+The book is a sorted file of fixed-size records keyed on canonical
+positions. It is memory-mapped and binary searched, so every process that
+opens it shares one copy in the page cache.
+"""
+
+import argparse
+import mmap
+import struct
+import time
+
+from bitboard import BitboardGame, BitboardState, GameConfig
+from minimax import search_root
+
+MAGIC = b"CTSB"
+VERSION = 1
+# Magic, version, players, rows, cols, then the number of records
+HEADER = struct.Struct(">4sBBBBI")
+# Square index of the move and the depth it was searched to
+VALUE = struct.Struct(">HB")
+
+
+def board_bytes(config: GameConfig) -> int:
+    return (config.rows * config.cols + 7) // 8
+
+
+def encode_key(config: GameConfig, state: BitboardState) -> bytes:
+    """Key of a canonical state: the player to move, then each board."""
+    size = board_bytes(config)
+    return bytes([state.current_player]) + b"".join(
+        board.to_bytes(size, "big") for board in state.boards
+    )
+
+
+class OpeningBook:
+    """Read-only, memory-mapped opening book."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, players, rows, cols, self.count = HEADER.unpack_from(self.mmap)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not an opening book")
+        self.config = GameConfig(players=players, rows=rows, cols=cols)
+        self.key_size = 1 + players * board_bytes(self.config)
+        self.record_size = self.key_size + VALUE.size
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _find(self, key: bytes) -> tuple[int, int] | None:
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            offset = HEADER.size + middle * self.record_size
+            record_key = self.mmap[offset : offset + self.key_size]
+            if record_key < key:
+                low = middle + 1
+            elif record_key > key:
+                high = middle
+            else:
+                return VALUE.unpack_from(self.mmap, offset + self.key_size)
+        return None
+
+    def lookup(
+        self, game: BitboardGame, state: BitboardState
+    ) -> tuple[int, int] | None:
+        """Return the book move for the state, or None if it isn't in the book."""
+        config = game.config
+        if (config.players, config.rows, config.cols) != (
+            self.config.players,
+            self.config.rows,
+            self.config.cols,
+        ):
+            return None
+
+        canonical, symmetry = game.canonical(state)
+        found = self._find(encode_key(config, canonical))
+        if found is None:
+            return None
+        square, _ = found
+        return divmod(game.untransform_square(square, symmetry), config.cols)
+
+    def close(self):
+        self.mmap.close()
+
+
+def opening_positions(game: BitboardGame, plies: int) -> list[BitboardState]:
+    """All canonical positions reachable in up to `plies` moves, without wins."""
+    layer = {game.canonical(game.new_game_state())[0]}
+    positions = set(layer)
+    for _ in range(plies):
+        next_layer = set()
+        for state in layer:
+            for square in game.unique_moves(state, game.legal_move_indices(state)):
+                new_state, winner = game.play_move_index(square, state)
+                if not winner:
+                    next_layer.add(game.canonical(new_state)[0])
+        layer = next_layer - positions
+        positions |= layer
+    return sorted(positions, key=lambda state: encode_key(game.config, state))
+
+
+def build_book(game: BitboardGame, plies: int, depth: int, path: str):
+    """Search every opening position to `depth` and write the book to `path`."""
+    config = game.config
+    positions = opening_positions(game, plies)
+    print(f"Searching {len(positions)} positions to depth {depth}")
+
+    start = time.perf_counter()
+    records = []
+    for i, state in enumerate(positions):
+        move, _ = search_root(game, state, depth)
+        if move is None:
+            continue
+        row, col = move
+        records.append(
+            encode_key(config, state) + VALUE.pack(row * config.cols + col, depth)
+        )
+        if (i + 1) % 100 == 0:
+            elapsed = time.perf_counter() - start
+            print(f"{i + 1}/{len(positions)} positions in {elapsed:.0f}s")
+
+    with open(path, "wb") as f:
+        f.write(
+            HEADER.pack(
+                MAGIC, VERSION, config.players, config.rows, config.cols, len(records)
+            )
+        )
+        f.writelines(records)
+    print(f"Wrote {len(records)} moves to {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--plies", type=int, default=2, help="Moves from the start")
+    parser.add_argument("--depth", type=int, default=6, help="Search depth")
+    parser.add_argument("--players", type=int, default=2)
+    parser.add_argument("--rows", type=int, default=5)
+    parser.add_argument("--cols", type=int, default=5)
+    parser.add_argument("--output", default="book.bin")
+    args = parser.parse_args()
+
+    config = GameConfig(players=args.players, rows=args.rows, cols=args.cols)
+    build_book(BitboardGame(config), args.plies, args.depth, args.output)
@@ -0,0 +1,208 @@
+"""Batched random playouts on bitboards packed into NumPy arrays.
+
+A batch is an array of boards of shape `[games, players]` (uint64, one
+bitboard per player, as in `BitboardState.boards`) and an array of the
+players to move. Moves, captures and wins for the whole batch are resolved
+with array operations, following the rules of `BitboardGame`.
+"""
+
+import numpy as np
+
+from bitboard import BitboardGame, BitboardState, GameConfig
+
+# Directions per square in the ray tables, see `tables.GameTables.rays`
+MAX_RAYS = 8
+# Random squares drawn per move before falling back to choosing among the
+# empty squares
+REJECTION_ROUNDS = 4
+
+
+def highest_bit(masks: np.ndarray) -> np.ndarray:
+    """The highest set bit of each mask, or 0 for empty masks."""
+    masks = masks.copy()
+    for shift in (1, 2, 4, 8, 16, 32):
+        masks |= masks >> np.uint64(shift)
+    return masks ^ (masks >> np.uint64(1))
+
+
+def lowest_bit(masks: np.ndarray) -> np.ndarray:
+    """The lowest set bit of each mask, or 0 for empty masks."""
+    return masks & (~masks + np.uint64(1))
+
+
+class BatchRollout:
+    """Plays batches of games with uniformly random moves.
+
+    The board must fit in 64 squares.
+    """
+
+    def __init__(self, game: BitboardGame, seed: int | None = None):
+        config = game.config
+        self.game = game
+        self.players = config.players
+        self.squares = config.rows * config.cols
+        if self.squares > 64:
+            raise ValueError("Batched rollouts need boards of at most 64 squares")
+        self.full_mask = np.uint64(game.full_mask)
+        self.rng = np.random.default_rng(seed)
+
+        # [squares, MAX_RAYS] ray masks, padded with empty rays
+        self.rays = np.zeros((self.squares, MAX_RAYS), dtype=np.uint64)
+        self.ascending = np.zeros((self.squares, MAX_RAYS), dtype=bool)
+        for square, rays in enumerate(game.rays):
+            for i, (mask, ascending) in enumerate(rays):
+                self.rays[square, i] = mask
+                self.ascending[square, i] = ascending
+
+        # [squares, most squares per square] corner masks, padded with 0
+        width = max(len(masks) for masks in game.square_corner_masks)
+        self.corner_masks = np.zeros((self.squares, width), dtype=np.uint64)
+        for square, masks in enumerate(game.square_corner_masks):
+            self.corner_masks[square, : len(masks)] = masks
+
+    def from_states(self, states: list[BitboardState]) -> tuple[np.ndarray, np.ndarray]:
+        """Pack states into arrays of boards and players to move."""
+        boards = np.array([state.boards for state in states], dtype=np.uint64)
+        players = np.array([state.current_player for state in states], dtype=np.int64)
+        return boards.reshape(len(states), self.players), players
+
+    def legal_masks(self, boards: np.ndarray) -> np.ndarray:
+        """Bitmask of the empty squares of each game."""
+        return self.full_mask & ~np.bitwise_or.reduce(boards, axis=1)
+
+    def sample_moves(self, legal: np.ndarray) -> np.ndarray:
+        """Pick a uniformly random square from each non-empty legal mask."""
+        # Draw squares until they are empty, which takes few rounds while
+        # boards are mostly empty
+        squares = self.rng.integers(self.squares, size=len(legal))
+        pending = np.arange(len(legal))
+        for _ in range(REJECTION_ROUNDS):
+            empty = (legal[pending] >> squares[pending].astype(np.uint64)) & np.uint64(
+                1
+            )
+            pending = pending[empty == 0]
+            if not len(pending):
+                return squares
+            squares[pending] = self.rng.integers(self.squares, size=len(pending))
+
+        # The legal square with the largest random key is a uniform choice
+        bits = np.unpackbits(
+            legal[pending].astype("<u8").view(np.uint8).reshape(-1, 8),
+            axis=1,
+            count=self.squares,
+            bitorder="little",
+        )
+        keys = np.where(bits, self.rng.random(bits.shape), -1.0)
+        squares[pending] = keys.argmax(axis=1)
+        return squares
+
+    def play_moves(
+        self,
+        boards: np.ndarray,
+        players: np.ndarray,
+        games: np.ndarray,
+        squares: np.ndarray,
+    ) -> np.ndarray:
+        """Play a move on each square for the given games, in place.
+
+        The squares must be empty. Returns a mask over `games` of the moves
+        that won; winners stay the player to move, as in `play_move`.
+        """
+        player = players[games]
+        move = np.left_shift(np.uint64(1), squares.astype(np.uint64))
+        boards[games, player] |= move
+        own = boards[games, player][:, None]
+
+        rays = self.rays[squares]
+        ascending = self.ascending[squares]
+        for offset in range(1, self.players):
+            opponent = (player + offset) % self.players
+            # The first square along each ray that isn't the opponent's
+            blockers = rays & ~boards[games, opponent][:, None]
+            low = lowest_bit(blockers)
+            high = highest_bit(blockers)
+            blocker = np.where(ascending, low, high)
+            between = rays & np.where(
+                ascending, low - np.uint64(1), ~((high << np.uint64(1)) - np.uint64(1))
+            )
+            captured = np.where(blocker & own, between, np.uint64(0))
+            boards[games, opponent] &= ~np.bitwise_or.reduce(captured, axis=1)
+
+        masks = self.corner_masks[squares]
+        won = (((own & masks) == masks) & (masks != 0)).any(axis=1)
+        players[games] = np.where(won, player, (player + 1) % self.players)
+        return won
+
+    def rollout(
+        self,
+        boards: np.ndarray,
+        players: np.ndarray,
+        max_moves: int | None = None,
+    ) -> np.ndarray:
+        """Play every game to the end with random moves.
+
+        Returns the winner of each game, or -1 for full boards and games
+        still going after `max_moves` moves, which can cycle through
+        captures. The arrays passed in are not modified.
+        """
+        boards = np.array(boards, dtype=np.uint64)
+        players = np.array(players, dtype=np.int64)
+        if max_moves is None:
+            max_moves = 4 * self.squares
+
+        winners = np.full(len(boards), -1, dtype=np.int8)
+        active = np.ones(len(boards), dtype=bool)
+        for _ in range(max_moves):
+            legal = self.legal_masks(boards)
+            active &= legal != 0
+            games = np.flatnonzero(active)
+            if not len(games):
+                break
+
+            won = self.play_moves(
+                boards, players, games, self.sample_moves(legal[games])
+            )
+            winners[games[won]] = players[games[won]]
+            active[games[won]] = False
+        return winners
+
+    def rollout_states(
+        self, states: list[BitboardState], max_moves: int | None = None
+    ) -> np.ndarray:
+        """Winners of random playouts from each state, see `rollout`."""
+        return self.rollout(*self.from_states(states), max_moves=max_moves)
+
+
+def test_matches_bitboard_game():
+    """Test random games move by move against `play_move_index`."""
+    for players, rows, cols in [(2, 5, 5), (3, 4, 4), (2, 8, 8)]:
+        game = BitboardGame(GameConfig(players=players, rows=rows, cols=cols))
+        rollout = BatchRollout(game, seed=0)
+        states = [game.new_game_state()] * 64
+        boards, current_players = rollout.from_states(states)
+        winners = [-1] * len(states)
+
+        for _ in range(4 * rows * cols):
+            legal = rollout.legal_masks(boards)
+            for i, state in enumerate(states):
+                assert int(legal[i]) == game.empty_squares(state)
+            done = (legal == 0) | (np.array(winners) != -1)
+            games = np.flatnonzero(~done)
+            if not len(games):
+                break
+
+            squares = rollout.sample_moves(legal[games])
+            won = rollout.play_moves(boards, current_players, games, squares)
+            for i, square, square_won in zip(games, squares, won):
+                states[i], expected = game.play_move_index(int(square), states[i])
+                assert square_won == expected
+                if expected:
+                    winners[i] = states[i].current_player
+
+            for i, state in enumerate(states):
+                assert tuple(int(board) for board in boards[i]) == state.boards
+                assert current_players[i] == state.current_player
+
+
+if __name__ == "__main__":
+    test_matches_bitboard_game()
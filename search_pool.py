@@ -0,0 +1,338 @@
+"""Pool of long-lived search processes for the game server."""
+
+import itertools
+import logging
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from bitboard import BitboardGame, BitboardState, GameConfig
+from mcts import MCTS
+from minimax import SearchResult, iterative_deepening
+from transposition import TranspositionTable
+
+logger = logging.getLogger(__name__)
+
+# Search engines that `submit` accepts
+ENGINES = ("minimax", "mcts")
+
+# Transposition table slots of each session, and the rough size of a full
+# slot (the entry and its numbers) for the sessions' memory cap
+SESSION_TABLE_SIZE = 1 << 16
+TABLE_SLOT_BYTES = 160
+# Ids of the last searches cancelled in each process that are kept. A
+# process holds at most two searches past the point `Future.cancel` works
+CANCELLED_SLOTS = 4
+
+# Games and tree searches of each process, by `repr` of their config
+_games: dict[str, BitboardGame] = {}
+_trees: dict[str, MCTS] = {}
+
+# Transposition tables and trees of the sessions searched in this process,
+# least recently used first, with when they were last used
+_sessions: OrderedDict[tuple, tuple[TranspositionTable | MCTS, float]] = OrderedDict()
+_max_sessions = 0
+_session_idle_s = 0.0
+
+# Id of the search running in this process, and the shared ids of the last
+# searches cancelled in it, which stop early
+_search_id = 0
+_cancelled_ids = None
+
+
+class PoolBusy(Exception):
+    """Raised when every search process is busy and the queue is full."""
+
+
+def _get_game(config: GameConfig) -> BitboardGame:
+    if repr(config) not in _games:
+        _games[repr(config)] = BitboardGame(config)
+    return _games[repr(config)]
+
+
+def _init_worker(
+    config: GameConfig, max_sessions: int, session_idle_s: float, cancelled_ids
+):
+    """Build the game tables when a search process starts."""
+    global _max_sessions, _session_idle_s, _cancelled_ids
+    _max_sessions = max_sessions
+    _session_idle_s = session_idle_s
+    _cancelled_ids = cancelled_ids
+    _get_game(config)
+
+
+def _cancelled() -> bool:
+    return _search_id in _cancelled_ids
+
+
+def _session_search(
+    session: str, engine: str, game: BitboardGame
+) -> TranspositionTable | MCTS:
+    """The session's table or tree, dropping sessions idle or over the cap."""
+    key = (session, engine, repr(game.config))
+    now = time.monotonic()
+    search = _sessions.pop(key, (None, now))[0]
+    while _sessions:
+        oldest, (_, last_used) = next(iter(_sessions.items()))
+        if len(_sessions) < _max_sessions and now - last_used <= _session_idle_s:
+            break
+        del _sessions[oldest]
+
+    if search is None:
+        search = (
+            MCTS(game) if engine == "mcts" else TranspositionTable(SESSION_TABLE_SIZE)
+        )
+    _sessions[key] = (search, now)
+    return search
+
+
+def _warm_up() -> bool:
+    return bool(_games)
+
+
+def _run_search(
+    config: GameConfig,
+    state: BitboardState,
+    budget_ms: float,
+    max_depth: int,
+    weights: dict[str, float] | None,
+    submitted_at: float,
+    engine: str = "minimax",
+    timed: bool = False,
+    session: str | None = None,
+    ponder: bool = False,
+    search_id: int = 0,
+) -> SearchResult:
+    """Search in a pool process, counting time spent queued against the budget.
+
+    The result's `budget_ms` is the budget left after queueing. The search
+    stops early once `SearchPool.cancel` cancels it.
+
+    The tree search keeps its tree for the next search of the same game
+    that this process runs. Searches of a session keep their own tree, or
+    transposition table, for the session's next search. Ponders search for
+    their whole budget, as nobody waits for them while they are queued.
+    """
+    global _search_id
+    _search_id = search_id
+    if not ponder:
+        queued_ms = (time.time() - submitted_at) * 1000
+        budget_ms = max(budget_ms - queued_ms, 1.0)
+    game = _get_game(config)
+    search = _session_search(session, engine, game) if session is not None else None
+    if engine == "mcts":
+        if search is None:
+            if repr(config) not in _trees:
+                _trees[repr(config)] = MCTS(game)
+            search = _trees[repr(config)]
+        result = search.search(state, budget_ms, cancelled=_cancelled)
+    else:
+        result = iterative_deepening(
+            game,
+            state,
+            budget_ms,
+            max_depth=max_depth,
+            table=search,
+            weights=weights,
+            timed=timed,
+            cancelled=_cancelled,
+        )
+    result.budget_ms = budget_ms
+    return result
+
+
+class SearchPool:
+    """Runs searches in pre-started processes with a bounded queue.
+
+    At most `workers + queue_size` searches are accepted at once; `submit`
+    raises `PoolBusy` beyond that, so callers can shed load instead of
+    queueing without limit.
+
+    Each process has its own queue, so that the searches of a session run
+    in the process holding its table or tree, unless it is pondering. Up to
+    `ponder_workers` searches on the opponent's time (ponders) run besides,
+    one at a time in processes with no other searches, and each process
+    keeps as many sessions as fit in `session_memory_mb`.
+    """
+
+    def __init__(
+        self,
+        config: GameConfig,
+        workers: int = 1,
+        queue_size: int = 8,
+        ponder_workers: int = 0,
+        session_memory_mb: int = 256,
+        session_idle_s: float = 300,
+    ):
+        self.config = config
+        self.workers = workers
+        max_sessions = max(
+            1, (session_memory_mb << 20) // (SESSION_TABLE_SIZE * TABLE_SLOT_BYTES)
+        )
+        self.initargs = (config, max_sessions, session_idle_s)
+        # Ids of the searches to stop in each process, written in turn, see
+        # `cancel`
+        self.cancelled_ids = [
+            multiprocessing.RawArray("q", CANCELLED_SLOTS) for _ in range(workers)
+        ]
+        self.cancelled_count = [0] * workers
+        self.search_ids = itertools.count(1)
+        # Process and id of each search queued or running
+        self.running: dict[Future, tuple[int, int]] = {}
+        self.executors = [self._new_executor(index) for index in range(workers)]
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.ponder_slots = threading.BoundedSemaphore(ponder_workers)
+        # Searches queued or running in each process, and which are ponders
+        self.searches: list[set[Future]] = [set() for _ in range(workers)]
+        self.ponders: list[set[Future]] = [set() for _ in range(workers)]
+        self.lock = threading.Lock()
+
+        # Start every process now, rather than on the first requests
+        warm_ups = [executor.submit(_warm_up) for executor in self.executors]
+        for future in warm_ups:
+            future.result()
+
+    def _new_executor(self, index: int) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=1,
+            initializer=_init_worker,
+            initargs=(*self.initargs, self.cancelled_ids[index]),
+        )
+
+    def _restart(self, index: int, executor: ProcessPoolExecutor):
+        """Replace the executor of a process that died, under the lock.
+
+        Its sessions' tables and trees are lost with it.
+        """
+        if self.executors[index] is executor:
+            logger.warning("Search process %d died, starting another", index)
+            self.executors[index] = self._new_executor(index)
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _load(self, index: int) -> int:
+        # A search is done before its callbacks run and drop it
+        return sum(not future.done() for future in self.searches[index])
+
+    def _process(self, session: str | None, ponder: bool) -> int | None:
+        """The process to search in, or None for a ponder with none free.
+
+        Searches go to the session's process, unless it is pondering, and
+        otherwise to the one with fewest searches. Ponders only go to a
+        process with no searches, the session's first.
+        """
+        home = hash(session) % self.workers if session is not None else None
+        if ponder:
+            free = [index for index in range(self.workers) if not self._load(index)]
+            if home in free:
+                return home
+            return free[0] if free else None
+        if home is not None and not any(
+            not future.done() for future in self.ponders[home]
+        ):
+            return home
+        return min(range(self.workers), key=self._load)
+
+    def submit(
+        self,
+        state: BitboardState,
+        budget_ms: float,
+        max_depth: int = 32,
+        weights: dict[str, float] | None = None,
+        engine: str = "minimax",
+        config: GameConfig | None = None,
+        timed: bool = False,
+        session: str | None = None,
+        ponder: bool = False,
+    ) -> Future:
+        """Queue a search, returning a future for its `SearchResult`.
+
+        `engine` is one of `ENGINES`; the tree search ignores `max_depth`,
+        `weights` and `timed`. Games of other configs than the pool's are
+        built in each process on first use. Ponders of a `session` raise
+        `PoolBusy` unless a process is free and the quota allows.
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine!r}")
+        if ponder and session is None:
+            raise ValueError("Only sessions ponder")
+
+        with self.lock:
+            index = self._process(session, ponder)
+            if index is None:
+                raise PoolBusy
+            slots = self.ponder_slots if ponder else self.slots
+            if not slots.acquire(blocking=False):
+                raise PoolBusy
+            if session is not None and index != hash(session) % self.workers:
+                session = None  # Its table and tree are in another process
+            search_id = next(self.search_ids)
+            args = (
+                config or self.config,
+                state,
+                budget_ms,
+                max_depth,
+                weights,
+                time.time(),
+                engine,
+                timed,
+                session,
+                ponder,
+                search_id,
+            )
+            executor = self.executors[index]
+            try:
+                try:
+                    future = executor.submit(_run_search, *args)
+                except BrokenProcessPool:
+                    # The process died while idle; search in a new one
+                    self._restart(index, executor)
+                    executor = self.executors[index]
+                    future = executor.submit(_run_search, *args)
+            except BrokenProcessPool as e:
+                slots.release()
+                raise PoolBusy from e
+            except BaseException:
+                slots.release()
+                raise
+            self.searches[index].add(future)
+            self.running[future] = (index, search_id)
+            if ponder:
+                self.ponders[index].add(future)
+
+        def release(_):
+            slots.release()
+            broken = not future.cancelled() and isinstance(
+                future.exception(), BrokenProcessPool
+            )
+            with self.lock:
+                self.searches[index].discard(future)
+                self.ponders[index].discard(future)
+                self.running.pop(future, None)
+                if broken:
+                    # The process died mid-search, e.g. killed for memory
+                    self._restart(index, executor)
+
+        future.add_done_callback(release)
+        return future
+
+    def cancel(self, future: Future):
+        """Cancel a search of the pool, stopping it early if it has started.
+
+        A search that has started stops at its next check, raising nothing:
+        its future gets the result so far, which nobody should use.
+        """
+        if future.cancel():
+            return
+        with self.lock:
+            if future in self.running:
+                index, search_id = self.running[future]
+                slot = self.cancelled_count[index] % CANCELLED_SLOTS
+                self.cancelled_ids[index][slot] = search_id
+                self.cancelled_count[index] += 1
+
+    def shutdown(self):
+        for executor in self.executors:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,573 @@
+"""Search service shared by the WSGI (main.py) and ASGI (asgi.py) apps.
+
+Holds the server's settings, search pool, move cache and opening book, and
+the handling of move requests that doesn't depend on the web framework.
+"""
+
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from typing import Iterator
+
+from bitboard import BitboardGame, BitboardState, GameConfig
+from evaluation import resolve_weights
+from metrics import Counter, Histogram
+from minimax import WIN_SCORE, SearchResult, score_moves
+from move_cache import MoveCache
+from opening_book import OpeningBook
+from search_pool import ENGINES, PoolBusy, SearchPool
+from sessions import SessionStore
+
+logger = logging.getLogger(__name__)
+
+# Sites allowed to call the API from the browser
+CORS_ORIGINS = [
+    "https://guppy16.github.io",
+    "http://localhost:3000",
+    "http://0.0.0.0:3000",
+]
+
+# Set up your game config
+config = GameConfig(players=2, rows=5, cols=5)
+game = BitboardGame(config)
+# Largest number of rows or columns that requests may ask for
+MAX_BOARD_SIZE = int(os.environ.get("MAX_BOARD_SIZE", 12))
+
+# Search time per move, unless the request asks for a budget or depth
+DEFAULT_BUDGET_MS = int(os.environ.get("AI_MOVE_BUDGET_MS", 1000))
+MAX_BUDGET_MS = int(os.environ.get("AI_MOVE_MAX_BUDGET_MS", 10000))
+# Deepest search a request may ask for, and the depth of timed searches
+MAX_DEPTH = 32
+# Search processes, and searches that may wait for one before we turn
+# requests away
+SEARCH_WORKERS = int(os.environ.get("SEARCH_WORKERS", os.cpu_count() or 1))
+SEARCH_QUEUE_SIZE = int(os.environ.get("SEARCH_QUEUE_SIZE", 8))
+# Longest a request waits for its search, including time queued
+SEARCH_TIMEOUT_MS = int(os.environ.get("SEARCH_TIMEOUT_MS", 30000))
+# Most moves in one /ai-moves request, and how often a batch retries the
+# pool while other requests fill it, in seconds
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 1000))
+BATCH_RETRY_INTERVAL = 0.05
+# Share of its budget a search must have had, rather than spent queued,
+# for its move to be cached
+CACHE_MIN_BUDGET = 0.9
+# Sessions, by `session` id of the requests, which ponder the opponent's
+# likeliest replies. Ponders run in up to `PONDER_WORKERS` processes while
+# they have no other searches, and each process keeps the transposition
+# tables or trees of as many sessions as fit in `SESSION_MEMORY_MB`
+MAX_SESSIONS = int(os.environ.get("MAX_SESSIONS", 10000))
+SESSION_IDLE_S = float(os.environ.get("SESSION_IDLE_S", 300))
+SESSION_MEMORY_MB = int(os.environ.get("SESSION_MEMORY_MB", 256))
+PONDER_WORKERS = int(os.environ.get("PONDER_WORKERS", max(1, SEARCH_WORKERS // 2)))
+PONDER_REPLIES = int(os.environ.get("PONDER_REPLIES", 3))
+# Longest session id accepted
+MAX_SESSION_ID = 64
+# Share of answered moves logged, as one JSON object per line, and the
+# level of the server's logs
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", 0.01))
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+
+# Moves already searched, optionally shared with other processes on disk
+move_cache = MoveCache(
+    max_entries=int(os.environ.get("MOVE_CACHE_SIZE", 10000)),
+    max_bytes=int(os.environ.get("MOVE_CACHE_MB", 64)) << 20,
+    path=os.environ.get("MOVE_CACHE_PATH"),
+)
+
+# Precomputed opening moves, see opening_book.py
+book = OpeningBook(os.environ["OPENING_BOOK"]) if "OPENING_BOOK" in os.environ else None
+
+sessions = SessionStore(MAX_SESSIONS, SESSION_IDLE_S)
+
+# Served at /metrics, see metrics.py
+http_requests = Counter(
+    "http_requests_total", "HTTP requests handled", ("route", "status")
+)
+http_request_seconds = Histogram(
+    "http_request_duration_seconds", "Time to answer an HTTP request", ("route",)
+)
+moves_answered = Counter(
+    "ai_moves_total", "Moves answered, by where they came from", ("source",)
+)
+search_seconds = Histogram(
+    "search_duration_seconds", "Time searching, once a search starts", ("engine",)
+)
+search_nodes = Counter("search_nodes_total", "Nodes searched", ("engine",))
+search_tt_probes = Counter(
+    "search_tt_probes_total", "Transposition table probes", ("engine",)
+)
+search_tt_hits = Counter(
+    "search_tt_hits_total", "Transposition table probes that hit", ("engine",)
+)
+search_cutoffs = Counter("search_cutoffs_total", "Alpha-beta cutoffs", ("engine",))
+ponders = Counter("ponders_total", "Searches started on the opponent's time")
+ponder_hits = Counter(
+    "ponder_hits_total", "Moves answered by a search started on the opponent's time"
+)
+
+
+def configure_logging():
+    """Log to stderr at `LOG_LEVEL`, unless logging is already set up."""
+    logging.basicConfig(
+        level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
+
+
+def observe_request(route: str, status: int, seconds: float):
+    http_requests.inc(route=route, status=status)
+    http_request_seconds.observe(seconds, route=route)
+
+
+_pool: SearchPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> SearchPool:
+    """Start the search processes on first use, not at import."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SearchPool(
+                config,
+                SEARCH_WORKERS,
+                SEARCH_QUEUE_SIZE,
+                PONDER_WORKERS,
+                SESSION_MEMORY_MB,
+                SESSION_IDLE_S,
+            )
+    return _pool
+
+
+def shutdown_pool():
+    """Stop the search processes, if they have started."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+@lru_cache(maxsize=None)
+def get_game(rows: int, cols: int) -> BitboardGame:
+    """The game for a board size, with the server's other settings."""
+    if (rows, cols) == (config.rows, config.cols):
+        return game
+    return BitboardGame(replace(config, rows=rows, cols=cols))
+
+
+def to_request_move(
+    game: BitboardGame, move: tuple[int, int] | None, symmetry: int
+) -> tuple[int, int] | None:
+    """Map a move on the canonical board back to the requested board.
+
+    None, for a search that found no move, stays None.
+    """
+    if move is None:
+        return None
+    row, col = move
+    cols = game.config.cols
+    square = game.untransform_square(row * cols + col, symmetry)
+    return divmod(square, cols)
+
+
+class BadRequest(Exception):
+    """Raised for a request that doesn't describe a search."""
+
+
+@dataclass
+class MoveSearch:
+    """A requested search, on the canonical form of the requested board."""
+
+    game: BitboardGame
+    state: BitboardState
+    symmetry: int  # Maps the canonical board back to the requested one
+    budget_ms: float
+    max_depth: int
+    weights: dict[str, float] | None
+    engine: str
+    key: tuple  # Of the move cache
+    stats: bool = False  # Whether the response includes the search's stats
+    session: str | None = None
+
+
+def search_key(
+    game: BitboardGame,
+    state: BitboardState,
+    max_depth: int,
+    budget_ms: float,
+    weights: dict[str, float] | None,
+    engine: str,
+) -> tuple:
+    """The move cache key of a search of the canonical `state`."""
+    game_config = game.config
+    return (
+        state.boards,
+        state.current_player,
+        max_depth,
+        budget_ms,
+        (game_config.players, game_config.rows, game_config.cols),
+        tuple(sorted(resolve_weights(game_config.weights, weights).items())),
+        engine,
+    )
+
+
+def parse_move_search(data) -> MoveSearch:
+    """Validate a request for a move, raising `BadRequest` with the reason."""
+    if not isinstance(data, dict):
+        raise BadRequest("Expected a JSON object")
+    rows = data.get("rows", config.rows)
+    cols = data.get("cols", config.cols)
+    if not all(isinstance(n, int) and 2 <= n <= MAX_BOARD_SIZE for n in (rows, cols)):
+        raise BadRequest(f"rows and cols must be 2 to {MAX_BOARD_SIZE}")
+    game = get_game(rows, cols)
+    game_config = game.config
+
+    boards = tuple(data.get("boards", ()))
+    if len(boards) != game_config.players or any(
+        not isinstance(board, int) or board < 0 or board & ~game.full_mask
+        for board in boards
+    ):
+        raise BadRequest("boards don't fit the board size")
+    occupied = 0
+    for board in boards:
+        if board & occupied:
+            raise BadRequest("boards overlap")
+        occupied |= board
+    current_player = data.get("current_player")
+    if current_player not in range(game_config.players):
+        raise BadRequest("current_player must be a player of the game")
+    state = BitboardState(boards=boards, current_player=current_player)
+    if not game.empty_squares(state):
+        raise BadRequest("The board is full")
+
+    weights = data.get("weights")
+    try:
+        resolve_weights(game_config.weights, weights)
+    except (TypeError, ValueError) as e:
+        raise BadRequest(str(e))
+
+    engine = data.get("engine", "minimax")
+    if engine not in ENGINES:
+        raise BadRequest(f"Unknown engine {engine!r}")
+    stats = data.get("stats", False)
+    if not isinstance(stats, bool):
+        raise BadRequest("stats must be true or false")
+    session = data.get("session")
+    if session is not None and not (
+        isinstance(session, str) and 0 < len(session) <= MAX_SESSION_ID
+    ):
+        raise BadRequest(
+            f"session must be a string of up to {MAX_SESSION_ID} characters"
+        )
+
+    try:
+        if "depth" in data and engine == "minimax":
+            # Fixed depth searches still stop at the longest budget, and in
+            # time to beat the request timeout
+            max_depth = int(data["depth"])
+            budget_ms = min(SEARCH_TIMEOUT_MS * 0.9, MAX_BUDGET_MS)
+        else:
+            max_depth = MAX_DEPTH
+            budget_ms = float(data.get("budget_ms", DEFAULT_BUDGET_MS))
+            # NaN would never reach the search's deadline
+            if not (math.isfinite(budget_ms) and budget_ms > 0):
+                raise BadRequest("budget_ms must be a positive number")
+            budget_ms = min(budget_ms, MAX_BUDGET_MS)
+    except (TypeError, ValueError):
+        raise BadRequest("depth and budget_ms must be numbers")
+    if not 1 <= max_depth <= MAX_DEPTH:
+        raise BadRequest(f"depth must be 1 to {MAX_DEPTH}")
+
+    # Search and cache the canonical form of symmetric positions
+    state, symmetry = game.canonical(state)
+    key = search_key(game, state, max_depth, budget_ms, weights, engine)
+    return MoveSearch(
+        game,
+        state,
+        symmetry,
+        budget_ms,
+        max_depth,
+        weights,
+        engine,
+        key,
+        stats,
+        session,
+    )
+
+
+def log_move(search: MoveSearch, response: dict, source: str):
+    """Count an answered move, and log a sample of them."""
+    moves_answered.inc(source=source)
+    if random.random() >= LOG_SAMPLE_RATE:
+        return
+    game_config = search.game.config
+    logger.info(
+        json.dumps(
+            {
+                "event": "ai_move",
+                "source": source,
+                "rows": game_config.rows,
+                "cols": game_config.cols,
+                "pieces": sum(board.bit_count() for board in search.state.boards),
+                "engine": search.engine,
+                "budget_ms": search.budget_ms,
+                **response,
+            }
+        )
+    )
+
+
+def known_move(search: MoveSearch) -> dict | None:
+    """The response from the opening book or move cache, if either has it."""
+    if book is not None:
+        book_move = book.lookup(search.game, search.state)
+        if book_move is not None:
+            response = {
+                "move": to_request_move(search.game, book_move, search.symmetry),
+                "depth": None,
+                "book": True,
+            }
+            log_move(search, response, "book")
+            ponder(search, book_move)
+            return response
+
+    cached = move_cache.get(search.key)
+    if cached is not None:
+        move, depth = cached
+        response = {
+            "move": to_request_move(search.game, move, search.symmetry),
+            "depth": depth,
+            "cached": True,
+        }
+        log_move(search, response, "cache")
+        ponder(search, move)
+        return response
+    return None
+
+
+def submit_search(search: MoveSearch) -> Future:
+    """Queue the search in the pool, raising `PoolBusy` if it's full.
+
+    A session's search that was pondered isn't queued again.
+    """
+    if search.session is not None:
+        pondered = sessions.take_ponder(search.session, search.key)
+        if pondered is not None:
+            ponder_hits.inc()
+            return pondered
+    return get_pool().submit(
+        search.state,
+        search.budget_ms,
+        search.max_depth,
+        search.weights,
+        search.engine,
+        search.game.config,
+        timed=search.stats,
+        session=search.session,
+    )
+
+
+def cancel_search(future: Future):
+    """Stop a search that nobody waits for any more, queued or running."""
+    get_pool().cancel(future)
+
+
+def ponder(search: MoveSearch, move: tuple[int, int]):
+    """Search the positions after the likeliest replies to the session's move.
+
+    Replies are taken in the order the search tries moves, once per
+    symmetry, and searched with the request's settings so the session's
+    next request can use them. Tree searches ponder one reply, as each
+    moves their tree to the reply.
+    """
+    if search.session is None:
+        return
+    sessions.cancel_ponders(search.session)
+    game = search.game
+    if move is None or not game.empty_squares(search.state):
+        return  # The game is over, so there was no move to reply to
+    state, won = game.play_move(move, search.state)
+    if won:
+        return
+
+    replies = game.unique_moves(state, game.legal_move_indices(state))
+    scored = score_moves(game, game.search_position(state), replies)
+    count = PONDER_REPLIES if search.engine == "minimax" else 1
+    pondered = {}
+    for _, reply in scored:
+        if len(pondered) >= count:
+            break
+        next_state, won = game.play_move_index(reply, state)
+        if won or not game.empty_squares(next_state):
+            continue
+        next_state, _ = game.canonical(next_state)
+        key = search_key(
+            game,
+            next_state,
+            search.max_depth,
+            search.budget_ms,
+            search.weights,
+            search.engine,
+        )
+        if key in pondered or key in move_cache:
+            continue
+        try:
+            pondered[key] = get_pool().submit(
+                next_state,
+                search.budget_ms,
+                search.max_depth,
+                search.weights,
+                search.engine,
+                game.config,
+                session=search.session,
+                ponder=True,
+            )
+        except PoolBusy:
+            break  # Out of quota, or the process has searches to run
+        ponders.inc()
+    sessions.set_ponders(search.session, pondered)
+
+
+def is_complete(search: MoveSearch, result: SearchResult) -> bool:
+    """Whether the result is as good as the search's settings allow.
+
+    Searches that reach their depth, or a forced or solved result, are.
+    Others are only if they had the budget, not the rest of it after
+    waiting in the queue.
+    """
+    if result.solved:
+        return True
+    if search.engine == "minimax" and (
+        result.depth >= search.max_depth or abs(result.score) >= WIN_SCORE
+    ):
+        return True
+    if search.max_depth < MAX_DEPTH:
+        return False  # A fixed depth search stopped by the longest budget
+    return (
+        result.budget_ms is None
+        or result.budget_ms >= search.budget_ms * CACHE_MIN_BUDGET
+    )
+
+
+def searched_move(
+    search: MoveSearch, result: SearchResult, record_stats: bool = True
+) -> dict:
+    """Cache a finished search and build its response.
+
+    Searches cut short, see `is_complete`, aren't cached. Adds the search's
+    stats to the metrics, unless `record_stats` is false for another request
+    answered by the same search.
+    """
+    if is_complete(search, result):
+        move_cache.put(search.key, (result.move, result.depth))
+    response = {
+        "move": to_request_move(search.game, result.move, search.symmetry),
+        "depth": result.depth,
+    }
+    stats = result.stats
+    if stats is not None and record_stats:
+        engine = search.engine
+        search_seconds.observe(stats.elapsed, engine=engine)
+        search_nodes.inc(stats.nodes, engine=engine)
+        search_tt_probes.inc(stats.tt_probes, engine=engine)
+        search_tt_hits.inc(stats.tt_hits, engine=engine)
+        search_cutoffs.inc(stats.cutoffs, engine=engine)
+    if stats is not None and search.stats:
+        response["stats"] = stats.as_dict()
+    log_move(search, response, "search")
+    ponder(search, result.move)
+    return response
+
+
+def batch_moves(items: list) -> Iterator[dict]:
+    """Answer each request of a batch, yielding results as they finish.
+
+    Searches that are the same up to symmetry run once. They are queued
+    only as the pool has room, so a batch waits rather than being turned
+    away, and each gets `SEARCH_TIMEOUT_MS` from when it is queued.
+    """
+    groups: dict[tuple, list[tuple[int, MoveSearch]]] = {}
+    for index, data in enumerate(items):
+        try:
+            search = parse_move_search(data)
+        except BadRequest as e:
+            yield {"index": index, "error": str(e)}
+            continue
+
+        try:
+            known = known_move(search)
+        except Exception:
+            logger.exception("Batch move failed")
+            yield {"index": index, "error": "Search failed"}
+            continue
+        if known is not None:
+            yield {"index": index, **known}
+        else:
+            groups.setdefault(search.key, []).append((index, search))
+
+    waiting = list(groups.values())
+    running: dict[Future, tuple[list[tuple[int, MoveSearch]], float]] = {}
+    timeout = SEARCH_TIMEOUT_MS / 1000
+    busy_since = None
+    try:
+        while waiting or running:
+            while waiting:
+                try:
+                    future = submit_search(waiting[0][0][1])
+                except PoolBusy:
+                    break
+                running[future] = (waiting.pop(0), time.monotonic() + timeout)
+                busy_since = None
+
+            if not running:
+                # Other requests fill the pool; wait for them, up to a point
+                busy_since = busy_since or time.monotonic()
+                if time.monotonic() - busy_since > timeout:
+                    for group in waiting:
+                        for index, _ in group:
+                            yield {"index": index, "error": "Server busy"}
+                    return
+                time.sleep(BATCH_RETRY_INTERVAL)
+                continue
+
+            next_deadline = min(deadline for _, deadline in running.values())
+            done, _ = wait(
+                running,
+                timeout=max(next_deadline - time.monotonic(), 0),
+                return_when=FIRST_COMPLETED,
+            )
+            for future in done:
+                group, _ = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception:
+                    logger.exception("Batch search failed")
+                    for index, _ in group:
+                        yield {"index": index, "error": "Search failed"}
+                    continue
+                for i, (index, search) in enumerate(group):
+                    try:
+                        response = searched_move(search, result, record_stats=i == 0)
+                    except Exception:
+                        logger.exception("Batch move failed")
+                        response = {"error": "Search failed"}
+                    yield {"index": index, **response}
+
+            now = time.monotonic()
+            for future, (group, deadline) in list(running.items()):
+                if deadline <= now:
+                    cancel_search(future)
+                    del running[future]
+                    for index, _ in group:
+                        yield {"index": index, "error": "Search timed out"}
+    finally:
+        # Also reached when the client disconnects part way through
+        for future in running:
+            cancel_search(future)
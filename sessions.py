@@ -0,0 +1,79 @@
+"""Game sessions of the server, which search on the opponent's time.
+
+After answering a move request with a `session` id, the server ponders: it
+searches the positions after the opponent's likeliest replies, so the
+session's next request is answered by a search that has finished or is
+under way. The search processes also keep each session's transposition
+table or tree, see `search_pool.SearchPool`.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Hashable
+
+
+@dataclass
+class Session:
+    last_used: float  # `time.monotonic()` seconds
+    # Searches of the positions after likely replies, by move cache key
+    ponders: dict[Hashable, Future] = field(default_factory=dict)
+
+
+class SessionStore:
+    """Sessions by id, dropped when idle or beyond `max_sessions`."""
+
+    def __init__(self, max_sessions: int = 10000, idle_seconds: float = 300):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.sessions: OrderedDict[str, Session] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def _touch(self, session_id: str) -> Session:
+        """Get or start the session, dropping those idle or over the cap."""
+        now = time.monotonic()
+        session = self.sessions.pop(session_id, None) or Session(now)
+        session.last_used = now
+        while self.sessions:
+            oldest_id, oldest = next(iter(self.sessions.items()))
+            if (
+                len(self.sessions) < self.max_sessions
+                and now - oldest.last_used <= self.idle_seconds
+            ):
+                break
+            self._cancel(self.sessions.pop(oldest_id))
+        self.sessions[session_id] = session
+        return session
+
+    @staticmethod
+    def _cancel(session: Session):
+        # Ponders already running finish, but nobody waits for them
+        for future in session.ponders.values():
+            future.cancel()
+        session.ponders.clear()
+
+    def take_ponder(self, session_id: str, key: Hashable) -> Future | None:
+        """Take the session's ponder of the key, cancelling the others."""
+        with self.lock:
+            session = self._touch(session_id)
+            future = session.ponders.pop(key, None)
+            self._cancel(session)
+        if future is None or future.cancelled():
+            return None
+        return future
+
+    def cancel_ponders(self, session_id: str):
+        with self.lock:
+            self._cancel(self._touch(session_id))
+
+    def set_ponders(self, session_id: str, ponders: dict[Hashable, Future]):
+        """Replace the session's ponders, cancelling any old ones."""
+        with self.lock:
+            session = self._touch(session_id)
+            self._cancel(session)
+            session.ponders.update(ponders)
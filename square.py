@@ -1,116 +1,248 @@
-import torch
+import numpy as np
+
+from bitboard import DIRECTIONS, BitboardGame, GameConfig
 
 
 class SquareGame:
-    def __init__(self, board_size=5, batch_size=1024, device="cuda"):
+    """Batch of two-player games stepped together with NumPy.
+
+    Follows the rules of `BitboardGame`: a move captures opponent lines that
+    it closes with another of the player's pieces in any of the 8
+    directions, and then wins if the player holds all four corners of an
+    axis-aligned square of size 2 or more. Finished games ignore moves.
+    """
+
+    def __init__(self, board_size=5, batch_size=1024, seed=None):
         self.board_size = board_size
         self.batch_size = batch_size
-        self.device = device
+        self.cells = board_size * board_size
+        # Index of an extra cell that is always empty, used to pad tables
+        self.sentinel = self.cells
+        self.rng = np.random.default_rng(seed)
 
-        # Create tensors for game state (all on GPU)
-        self.reset()
+        # Pre-compute all possible squares (static tables)
+        self.possible_squares = self._precompute_squares()
+        self.cell_squares = self._precompute_cell_squares()
 
-        # Pre-compute all possible squares (static tensor)
-        self.possible_squares = self._precompute_squares().to(device)
+        # Pre-compute the rays of cells in the 8 directions from every cell
+        self.direction_offsets = self._precompute_directions()
+        self.rays = self._precompute_rays()
 
-        # Pre-compute direction kernels for captures
-        self.direction_offsets = self._precompute_directions().to(device)
+        self.reset()
 
     def reset(self):
-        # Initialize board states: [batch, 2, height, width]
-        # Channel 0: Player 1 pieces, Channel 1: Player 2 pieces
-        self.boards = torch.zeros(
-            self.batch_size,
-            2,
-            self.board_size,
-            self.board_size,
-            dtype=torch.bool,
-            device=self.device,
-        )
+        # Board states: [batch, 2, cells + 1], channel 0: player 1 pieces,
+        # channel 1: player 2 pieces, plus the sentinel cell
+        self._cells = np.zeros((self.batch_size, 2, self.cells + 1), dtype=bool)
 
         # Current player: 0 = player 1, 1 = player 2
-        self.current_players = torch.zeros(
-            self.batch_size, dtype=torch.int64, device=self.device
-        )
+        self.current_players = np.zeros(self.batch_size, dtype=np.int64)
 
         # Game finished indicators
-        self.done = torch.zeros(self.batch_size, dtype=torch.bool, device=self.device)
+        self.done = np.zeros(self.batch_size, dtype=bool)
 
         # Winners: -1 = no winner, 0 = player 1, 1 = player 2
-        self.winners = torch.full(
-            (self.batch_size,), -1, dtype=torch.int8, device=self.device
+        self.winners = np.full(self.batch_size, -1, dtype=np.int8)
+
+    @property
+    def boards(self):
+        """Pieces as [batch, 2, board_size, board_size] booleans (a view)."""
+        return self._cells[:, :, : self.cells].reshape(
+            self.batch_size, 2, self.board_size, self.board_size
         )
 
     def _precompute_squares(self):
-        # Create a list of all possible squares on the board
-        # Each square is represented by the coordinates of its 4 corners
+        # All possible squares as the flat indices of their 4 corners, plus
+        # a last square made of the sentinel that can never be completed
+        n = self.board_size
         squares = []
 
-        for size in range(1, self.board_size):
-            for r in range(self.board_size - size + 1):
-                for c in range(self.board_size - size + 1):
-                    # Square with (r,c) as top-left
-                    squares.append(
-                        torch.tensor(
-                            [[r, c], [r, c + size], [r + size, c], [r + size, c + size]]
-                        )
-                    )
-
-                    # Add other square configurations...
-
-        return torch.stack(squares)
+        for size in range(1, n):
+            for r in range(n - size):
+                for c in range(n - size):
+                    corners = [
+                        (r, c),
+                        (r, c + size),
+                        (r + size, c),
+                        (r + size, c + size),
+                    ]
+                    squares.append([row * n + col for row, col in corners])
+
+        squares.append([self.sentinel] * 4)
+        return np.array(squares, dtype=np.int64)
+
+    def _precompute_cell_squares(self):
+        # [cells, max squares per cell]: the squares with a corner on each
+        # cell, padded with the sentinel square
+        padding = len(self.possible_squares) - 1
+        per_cell = [[] for _ in range(self.cells)]
+        for index, corners in enumerate(self.possible_squares[:-1]):
+            for cell in corners:
+                per_cell[cell].append(index)
+
+        width = max(len(squares) for squares in per_cell)
+        table = np.full((self.cells, width), padding, dtype=np.int64)
+        for cell, squares in enumerate(per_cell):
+            table[cell, : len(squares)] = squares
+        return table
 
     def _precompute_directions(self):
-        # Create kernels for the 8 possible directions for captures
-        return torch.tensor(
-            [[1, 0], [1, 1], [0, 1], [-1, 1], [-1, 0], [-1, -1], [0, -1], [1, -1]],
-            device=self.device,
-        )
+        # The 8 possible directions for captures
+        return np.array(DIRECTIONS, dtype=np.int64)
+
+    def _precompute_rays(self):
+        # [cells, 8, board_size]: cells in each direction from each cell,
+        # nearest first, padded with the sentinel (at least once per ray)
+        n = self.board_size
+        rays = np.full((self.cells, len(self.direction_offsets), n), self.sentinel)
+        for cell in range(self.cells):
+            row, col = divmod(cell, n)
+            for d, (dr, dc) in enumerate(self.direction_offsets):
+                r, c, step = row + dr, col + dc, 0
+                while 0 <= r < n and 0 <= c < n:
+                    rays[cell, d, step] = r * n + c
+                    r, c, step = r + dr, c + dc, step + 1
+        return rays
+
+    def _flat_index(self, games, players, cells):
+        # Indices into the flattened `_cells` array, which NumPy gathers and
+        # scatters much faster than with one index array per axis
+        stride = self.cells + 1
+        return (games * 2 + players) * stride + cells
+
+    def legal_moves_mask(self):
+        """[batch, cells] mask of empty cells, all False for finished games."""
+        empty = ~(self._cells[:, 0, : self.cells] | self._cells[:, 1, : self.cells])
+        return empty & ~self.done[:, None]
+
+    def random_moves(self):
+        """Pick a uniformly random legal move per game as [batch, 2] (row, col).
+
+        Finished games get the move (0, 0), which is ignored.
+        """
+        legal = self.legal_moves_mask()
+        # The legal cell with the largest random key is a uniform choice
+        keys = np.where(legal, self.rng.random(legal.shape), -1.0)
+        cells = keys.argmax(axis=1)
+        return np.stack(divmod(cells, self.board_size), axis=1)
 
     def make_moves(self, moves):
         """Process moves for all games in the batch"""
         # moves: [batch_size, 2] with each move as [row, col]
+        moves = np.asarray(moves)
+        games = np.flatnonzero(~self.done)
+        cells = moves[games, 0] * self.board_size + moves[games, 1]
+        players = self.current_players[games]
 
-        # 1. Update boards with new pieces
-        batch_indices = torch.arange(self.batch_size, device=self.device)
-        player_indices = self.current_players
+        flat = self._cells.reshape(-1)
+        if (
+            flat[self._flat_index(games, 0, cells)]
+            | flat[self._flat_index(games, 1, cells)]
+        ).any():
+            raise ValueError("Moves must be on empty cells")
 
-        # Place pieces on the board
-        self.boards[batch_indices, player_indices, moves[:, 0], moves[:, 1]] = True
+        # 1. Place pieces on the board
+        flat[self._flat_index(games, players, cells)] = True
 
-        # 2. Check for winning squares
-        self._check_for_winners(moves)
+        # 2. Process captures
+        self._process_captures(games, players, cells)
 
-        # 3. Process captures
-        self._process_captures(moves)
+        # 3. Check for winning squares
+        won = self._check_for_winners(games, players, cells)
+        self.winners[games[won]] = players[won]
+        self.done[games[won]] = True
 
-        # 4. Switch players
-        self.current_players = 1 - self.current_players
+        # 4. Switch players, except for the winners; full boards are draws
+        self.current_players[games[~won]] = 1 - players[~won]
+        self.done |= ~self.legal_moves_mask().any(axis=1)
 
         return self._get_observations()
 
-    def _check_for_winners(self, moves):
-        """Check if any games in the batch have been won"""
-        # Implementation using tensor operations to check all possible squares
-        # This would use the pre-computed squares tensor
-        pass
+    def _check_for_winners(self, games, players, cells):
+        """Check which moves completed a square, as a mask over `games`"""
+        squares = self.cell_squares[cells]  # [games, k]
+        corners = self.possible_squares[squares]  # [games, k, 4]
+        index = self._flat_index(games[:, None, None], players[:, None, None], corners)
+        owned = self._cells.reshape(-1)[index]
+        return owned.all(axis=2).any(axis=1)
 
-    def _process_captures(self, moves):
+    def _process_captures(self, games, players, cells):
         """Process piece captures for all games in batch"""
-        # Implementation using convolution or indexing operations
-        pass
+        opponents = 1 - players
+        rays = self.rays[cells]  # [games, 8, board_size]
+        flat = self._cells.reshape(-1)
+        g = games[:, None, None]
+        opponent_index = self._flat_index(g, opponents[:, None, None], rays)
+        opponent_cells = flat[opponent_index]
+        own_cells = flat[self._flat_index(g, players[:, None, None], rays)]
+
+        # The first cell along each ray that isn't the opponent's (the
+        # sentinel guarantees there is one) must be the player's
+        blocker = (~opponent_cells).argmax(axis=2)  # [games, 8]
+        closed = np.take_along_axis(own_cells, blocker[:, :, None], axis=2)[:, :, 0]
+        captured = (np.arange(self.board_size) < blocker[:, :, None]) & closed[
+            :, :, None
+        ]
+
+        flat[opponent_index[captured]] = False
 
     def _get_observations(self):
         """Return current game state as observation tensors"""
         # Format suitable for neural network input
-        obs = torch.cat(
-            [
-                self.boards,
-                self.current_players.view(self.batch_size, 1, 1, 1).expand(
-                    -1, 1, self.board_size, self.board_size
-                ),
-            ],
-            dim=1,
+        n = self.board_size
+        players = np.broadcast_to(
+            self.current_players.reshape(self.batch_size, 1, 1, 1),
+            (self.batch_size, 1, n, n),
         )
+        obs = np.concatenate([self.boards, players.astype(bool)], axis=1)
 
         return {"observation": obs, "done": self.done, "winner": self.winners}
+
+    def play_random_games(self):
+        """Play every game in the batch to the end with random moves.
+
+        Returns the number of moves played. Games can cycle through captures,
+        so stop after a generous number of turns and count the rest as draws.
+        """
+        self.reset()
+        moves_played = 0
+        for _ in range(self.cells * 8):
+            if self.done.all():
+                break
+            moves_played += int((~self.done).sum())
+            self.make_moves(self.random_moves())
+        return moves_played
+
+
+def test_matches_bitboard_game():
+    """Test random games of a batch move by move against `BitboardGame`."""
+    game = BitboardGame(GameConfig(players=2, rows=5, cols=5))
+    batch = SquareGame(board_size=5, batch_size=64, seed=0)
+    states = [game.new_game_state()] * batch.batch_size
+    winners = [-1] * batch.batch_size
+
+    for _ in range(batch.cells * 8):
+        if batch.done.all():
+            break
+        moves = batch.random_moves()
+        playing = np.flatnonzero(~batch.done)
+        batch.make_moves(moves)
+
+        for i in playing:
+            row, col = moves[i]
+            states[i], won = game.play_move_index(int(row * 5 + col), states[i])
+            if won:
+                winners[i] = states[i].current_player
+
+        for i, state in enumerate(states):
+            for player in range(2):
+                cells = np.flatnonzero(batch._cells[i, player, : batch.cells])
+                assert sum(1 << int(cell) for cell in cells) == state.boards[player]
+            assert batch.winners[i] == winners[i]
+            assert batch.done[i] == (winners[i] != -1 or not game.empty_squares(state))
+            assert batch.current_players[i] == state.current_player
+    assert batch.done.all()
+
+
+if __name__ == "__main__":
+    test_matches_bitboard_game()
@@ -0,0 +1,217 @@
+"""Precomputed tables of each board shape, shared by all its games.
+
+Tables are built once per `(players, rows, cols)` in each process. With a
+directory (by default the `GAME_TABLES_DIR` environment variable), they are
+also pickled there, so later processes load them instead of building them.
+Only point it at a directory you trust, since loading unpickles its files.
+"""
+
+import os
+import pickle
+import tempfile
+from dataclasses import dataclass
+from itertools import product
+
+from bitboard import DIRECTIONS, GameConfig, zobrist_keys
+
+# Bump when the tables change, so files of older versions are rebuilt
+TABLES_VERSION = 1
+
+
+@dataclass(frozen=True)
+class GameTables:
+    players: int
+    rows: int
+    cols: int
+    full_mask: int
+    # Corner masks of the squares with a corner on each square index
+    square_corner_masks: tuple[tuple[int, ...], ...]
+    # Every corner mask once
+    corner_masks: tuple[int, ...]
+    # `(mask, ascending)` for each direction from each square, see `_rays`
+    rays: tuple[tuple[tuple[int, bool], ...], ...]
+    # The other players of each player
+    opponents: tuple[tuple[int, ...], ...]
+    # Symmetries as permutations of square indices, the identity first
+    symmetries: tuple[tuple[int, ...], ...]
+    inverse_symmetries: tuple[int, ...]
+    # Byte lookup tables of each symmetry, see `_permutation_tables`
+    symmetry_tables: tuple[tuple[tuple[int, ...], ...], ...]
+    zobrist_squares: tuple[tuple[int, ...], ...]
+    zobrist_turn: tuple[int, ...]
+
+
+def _corner_masks(rows: int, cols: int) -> list[list[int]]:
+    """Compute the masks for the corners of all possible squares, per square."""
+    square_masks: list[list[int]] = [[] for _ in range(rows * cols)]
+
+    for size in range(2, min(rows, cols) + 1):  # Size of the square (2x2, ...)
+        for row, col in product(range(rows - size + 1), range(cols - size + 1)):
+            corners = [
+                row * cols + col,
+                row * cols + col + size - 1,
+                (row + size - 1) * cols + col,
+                (row + size - 1) * cols + col + size - 1,
+            ]
+            mask = 0
+            for corner in corners:
+                mask |= 1 << corner
+            for corner in corners:
+                square_masks[corner].append(mask)
+
+    return square_masks
+
+
+def _rays(rows: int, cols: int) -> list[tuple[tuple[int, bool], ...]]:
+    """Compute the mask of the squares in each direction from every square.
+
+    Rays are stored per square index as `(mask, ascending)`, where
+    `ascending` is true if the ray runs towards higher bit indices.
+    Directions that leave the board straight away are left out.
+    """
+    rays = []
+    for row, col in product(range(rows), range(cols)):
+        square_rays = []
+        for dr, dc in DIRECTIONS:
+            mask = 0
+            r, c = row + dr, col + dc
+            while 0 <= r < rows and 0 <= c < cols:
+                mask |= 1 << (r * cols + c)
+                r += dr
+                c += dc
+            if mask:
+                square_rays.append((mask, dr * cols + dc > 0))
+        rays.append(tuple(square_rays))
+    return rays
+
+
+def _symmetries(rows: int, cols: int) -> list[tuple[int, ...]]:
+    """Compute the symmetries of the board as permutations of squares.
+
+    A square board has the 8 rotations and reflections of the square;
+    other rectangles only the identity, the two reflections and the half
+    turn. The identity is always first.
+    """
+    transforms = [
+        lambda r, c: (r, c),
+        lambda r, c: (r, cols - 1 - c),
+        lambda r, c: (rows - 1 - r, c),
+        lambda r, c: (rows - 1 - r, cols - 1 - c),
+    ]
+    if rows == cols:
+        transforms += [
+            lambda r, c: (c, r),
+            lambda r, c: (c, rows - 1 - r),
+            lambda r, c: (cols - 1 - c, r),
+            lambda r, c: (cols - 1 - c, rows - 1 - r),
+        ]
+
+    permutations = []
+    for transform in transforms:
+        permutation = []
+        for row, col in product(range(rows), range(cols)):
+            new_row, new_col = transform(row, col)
+            permutation.append(new_row * cols + new_col)
+        permutations.append(tuple(permutation))
+    return permutations
+
+
+def _permutation_tables(permutation: tuple[int, ...]) -> tuple[tuple[int, ...], ...]:
+    """Tables mapping each byte of a bitboard to its permuted bits."""
+    tables = []
+    for offset in range(0, len(permutation), 8):
+        squares = permutation[offset : offset + 8]
+        table = [0] * 256
+        for byte in range(1, 1 << len(squares)):
+            low = byte & -byte
+            table[byte] = table[byte ^ low] | 1 << squares[low.bit_length() - 1]
+        tables.append(tuple(table))
+    return tuple(tables)
+
+
+def build_tables(players: int, rows: int, cols: int) -> GameTables:
+    squares = rows * cols
+    square_corner_masks = tuple(tuple(masks) for masks in _corner_masks(rows, cols))
+    symmetries = _symmetries(rows, cols)
+    zobrist_squares, zobrist_turn = zobrist_keys(players, squares)
+
+    return GameTables(
+        players=players,
+        rows=rows,
+        cols=cols,
+        full_mask=(1 << squares) - 1,
+        square_corner_masks=square_corner_masks,
+        corner_masks=tuple(
+            dict.fromkeys(mask for masks in square_corner_masks for mask in masks)
+        ),
+        rays=tuple(_rays(rows, cols)),
+        opponents=tuple(
+            tuple(other for other in range(players) if other != player)
+            for player in range(players)
+        ),
+        symmetries=tuple(symmetries),
+        inverse_symmetries=tuple(
+            symmetries.index(tuple(sorted(range(squares), key=symmetry.__getitem__)))
+            for symmetry in symmetries
+        ),
+        symmetry_tables=tuple(_permutation_tables(symmetry) for symmetry in symmetries),
+        zobrist_squares=tuple(
+            tuple(keys[:squares]) for keys in zobrist_squares[:players]
+        ),
+        zobrist_turn=tuple(zobrist_turn[:players]),
+    )
+
+
+def tables_path(directory: str, players: int, rows: int, cols: int) -> str:
+    name = f"tables-v{TABLES_VERSION}-{players}p-{rows}x{cols}.pickle"
+    return os.path.join(directory, name)
+
+
+def load_tables(path: str) -> GameTables:
+    with open(path, "rb") as f:
+        tables = pickle.load(f)
+    if not isinstance(tables, GameTables):
+        raise ValueError(f"{path} does not hold game tables")
+    return tables
+
+
+def save_tables(tables: GameTables, path: str):
+    """Write the tables, replacing the file at once so readers never see
+    part of it."""
+    directory = os.path.dirname(path) or "."
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as f:
+        pickle.dump(tables, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(f.name, path)
+
+
+# Tables of every shape used in this process
+_tables: dict[tuple[int, int, int], GameTables] = {}
+
+
+def get_tables(config: GameConfig, directory: str | None = None) -> GameTables:
+    """Return the tables of the config's board shape, building them once."""
+    shape = (config.players, config.rows, config.cols)
+    tables = _tables.get(shape)
+    if tables is not None:
+        return tables
+
+    directory = directory or os.environ.get("GAME_TABLES_DIR")
+    path = None
+    if directory:
+        path = tables_path(directory, *shape)
+        try:
+            tables = load_tables(path)
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+            tables = None  # Missing or unreadable, so build it again
+
+    if tables is None or (tables.players, tables.rows, tables.cols) != shape:
+        tables = build_tables(*shape)
+        if path is not None:
+            try:
+                os.makedirs(directory, exist_ok=True)
+                save_tables(tables, path)
+            except OSError:
+                pass  # Not shared this time, but the tables still work
+
+    _tables[shape] = tables
+    return tables
@@ -0,0 +1,66 @@
+"""Transposition table for the Complete The Square search."""
+
+from dataclasses import dataclass
+
+# Bound types of a stored score
+EXACT = 0
+LOWER = 1  # Search failed high: the true score is at least `value`
+UPPER = 2  # Search failed low: the true score is at most `value`
+
+
+@dataclass(frozen=True, slots=True)
+class TTEntry:
+    key: int
+    depth: int
+    bound: int
+    value: float
+    move: int | None  # Square index of the best move
+    generation: int
+
+
+class TranspositionTable:
+    """Fixed-size hash table of search results keyed on Zobrist hashes.
+
+    Each slot holds one entry. A new entry replaces the old one when it is
+    for the same position, was searched at least as deep, or the old entry
+    is left over from an earlier search (generation).
+    """
+
+    def __init__(self, size: int = 1 << 18):
+        assert size > 0 and size & (size - 1) == 0, "Size must be a power of two"
+        self.mask = size - 1
+        self.entries: list[TTEntry | None] = [None] * size
+        self.generation = 0
+
+    def __len__(self) -> int:
+        return sum(entry is not None for entry in self.entries)
+
+    def new_search(self):
+        """Age the table so entries from earlier searches can be replaced."""
+        self.generation += 1
+
+    def clear(self):
+        self.entries = [None] * (self.mask + 1)
+
+    def probe(self, key: int) -> TTEntry | None:
+        """Return the entry for the position, if stored."""
+        entry = self.entries[key & self.mask]
+        if entry is not None and entry.key == key:
+            return entry
+        return None
+
+    def store(self, key: int, depth: int, bound: int, value: float, move: int | None):
+        """Store a search result, subject to the replacement policy."""
+        index = key & self.mask
+        old = self.entries[index]
+        if (
+            old is None
+            or old.key == key
+            or depth >= old.depth
+            or old.generation != self.generation
+        ):
+            if move is None and old is not None and old.key == key:
+                move = old.move  # Keep the best move of a shallower search
+            self.entries[index] = TTEntry(
+                key, depth, bound, value, move, self.generation
+            )